@@ -1,46 +1,84 @@
 """
-Advanced RAG Chain using FlashRank and Multi-Query Retrieval
+Advanced RAG Chain using an ONNX cross-encoder and Multi-Query Retrieval
 - Multi-Query: Expands query to increase recall
-- FlashRank: Re-ranks documents using cross-encoder for precision
+- Reranker: Re-ranks documents using an ONNX cross-encoder for precision
 """
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from functools import lru_cache
+import asyncio
+import contextlib
 import logging
+import re
+import threading
+import numpy as np
+import xxhash
+from cachetools import LRUCache
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_pinecone import PineconeVectorStore
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain_community.document_compressors.flashrank_rerank import FlashrankRerank
 from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import BaseOutputParser
 from langchain_core.embeddings import Embeddings
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, get_buffer_string
 from google import genai
 
 from app.config import settings
+from app.chains.reranker import OnnxCrossEncoderCompressor
 from app.chains.chain_utils import get_memory, QA_PROMPT, session_chains, session_memories
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared genai client for cached query embeddings
+_genai_client = None
+
+
+def _get_genai_client() -> genai.Client:
+    """Get or create the shared genai client"""
+    global _genai_client
+    if _genai_client is None:
+        _genai_client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+    return _genai_client
+
+
+# Query embedding cache: (text, model, dimensions) -> read-only float32 vector.
+# float32 is what Pinecone stores (3 KB per 768-dim vector vs ~25 KB as Python floats).
+query_embedding_cache: LRUCache = LRUCache(maxsize=1024)
+_query_embedding_lock = threading.Lock()
+
+
+async def close_genai_client():
+    """Close the shared genai client's connections (called on shutdown)"""
+    global _genai_client
+    if _genai_client is not None:
+        await _genai_client.aio.aclose()
+        _genai_client.close()
+        _genai_client = None
+
 
 class GenAIEmbeddings(Embeddings):
     """
     Custom Embeddings class using google.genai SDK directly.
     Ensures 768-dimensional output to match Pinecone index.
+    Async methods call the SDK's native aio client instead of a thread pool.
     """
     
     def __init__(self, model: str = "gemini-embedding-001", dimensions: int = 768):
         self.model = model
         self.dimensions = dimensions
-        self._client = genai.Client(api_key=settings.GOOGLE_API_KEY)
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Embed a list of documents."""
         embeddings = []
         for text in texts:
-            result = self._client.models.embed_content(
+            result = _get_genai_client().models.embed_content(
                 model=self.model,
                 contents=text[:8000],
                 config={"output_dimensionality": self.dimensions}
@@ -48,14 +86,55 @@ class GenAIEmbeddings(Embeddings):
             embeddings.append(list(result.embeddings[0].values))
         return embeddings
     
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents concurrently."""
+        results = await asyncio.gather(*[
+            _get_genai_client().aio.models.embed_content(
+                model=self.model,
+                contents=text[:8000],
+                config={"output_dimensionality": self.dimensions}
+            )
+            for text in texts
+        ])
+        return [list(result.embeddings[0].values) for result in results]
+    
+    def _cache_key(self, text: str) -> Tuple[str, str, int]:
+        return (text[:8000], self.model, self.dimensions)
+    
+    def _cache_vector(self, key: Tuple[str, str, int], values: List[float]) -> np.ndarray:
+        vector = np.asarray(values, dtype=np.float32)
+        vector.flags.writeable = False
+        with _query_embedding_lock:
+            query_embedding_cache[key] = vector
+        return vector
+    
     def embed_query(self, text: str) -> List[float]:
-        """Embed a query."""
-        result = self._client.models.embed_content(
-            model=self.model,
-            contents=text[:8000],
-            config={"output_dimensionality": self.dimensions}
-        )
-        return list(result.embeddings[0].values)
+        """Embed a query (served from the LRU cache on repeats)."""
+        key = self._cache_key(text)
+        with _query_embedding_lock:
+            vector = query_embedding_cache.get(key)
+        if vector is None:
+            result = _get_genai_client().models.embed_content(
+                model=self.model,
+                contents=key[0],
+                config={"output_dimensionality": self.dimensions}
+            )
+            vector = self._cache_vector(key, result.embeddings[0].values)
+        return vector.tolist()
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a query without blocking the event loop (shares the LRU cache)."""
+        key = self._cache_key(text)
+        with _query_embedding_lock:
+            vector = query_embedding_cache.get(key)
+        if vector is None:
+            result = await _get_genai_client().aio.models.embed_content(
+                model=self.model,
+                contents=key[0],
+                config={"output_dimensionality": self.dimensions}
+            )
+            vector = self._cache_vector(key, result.embeddings[0].values)
+        return vector.tolist()
 
 
 class LineListOutputParser(BaseOutputParser[List[str]]):
@@ -64,103 +143,273 @@ class LineListOutputParser(BaseOutputParser[List[str]]):
         lines = text.strip().split("\n")
         return [line.strip() for line in lines if line.strip()]
 
-def get_advanced_retriever(namespace: str):
+
+class ParallelMultiQueryRetriever(MultiQueryRetriever):
     """
-    Creates an advanced retriever pipeline:
-    1. Multi-Query Retriever (Expansion) -> Gets ~10 docs
-    2. FlashRank Reranker (Compression) -> Selects Top 5
+    Multi-Query retriever that de-duplicates the merged results by vector ID.
+    Sub-queries already fan out concurrently in MultiQueryRetriever's async
+    path (asyncio.gather, with child callbacks for tracing) when the chain
+    runs via ainvoke.
+    """
+
+    def unique_union(self, documents: List[Document]) -> List[Document]:
+        """Drop duplicate chunks returned by overlapping queries."""
+        seen = set()
+        return [
+            doc for doc in documents
+            if (key := doc_key(doc)) not in seen and not seen.add(key)
+        ]
+
+
+def doc_key(doc: Document):
+    """Dedup key: the Pinecone vector ID, or a 64-bit content hash when missing"""
+    return doc.id or xxhash.xxh3_64_intdigest(doc.page_content.encode())
+
+
+# Words that carry no search signal, stripped for the keyword-only variant
+_STOPWORDS = frozenset("""
+a an the is are was were be been being am do does did of in on at to for from by with
+about as into over under and or but if then so than that this these those there here
+what which who whom whose when where why how can could would should will shall may might
+must i me my we our you your he him his she her it its they them their please tell
+show give find any some all
+""".split())
+
+# Domain synonyms, applied as whole-word rewrites for the synonym variant
+_SYNONYMS = {
+    "birthday": "born on",
+    "born": "birthday",
+    "cost": "price",
+    "price": "cost",
+    "salary": "compensation",
+    "meeting": "call",
+    "deadline": "due date",
+    "due": "deadline",
+    "boss": "manager",
+    "manager": "lead",
+    "revenue": "sales",
+    "sales": "revenue",
+    "plan": "roadmap",
+    "roadmap": "plan",
+    "issue": "problem",
+    "problem": "issue",
+    "summary": "overview",
+    "overview": "summary",
+    "goal": "objective",
+    "objective": "goal",
+}
+
+_WORD_RE = re.compile(r"[\w'.-]+")
+
+
+@lru_cache(maxsize=1024)
+def expand_query(query: str) -> Tuple[str, ...]:
+    """
+    Deterministic query variants: keyword-only (stopwords stripped) and a
+    synonym-map rewrite. Variants identical to the query are dropped.
     """
-    # Use custom embeddings with explicit 768 dimensions
-    embeddings = GenAIEmbeddings(model="gemini-embedding-001", dimensions=768)
+    words = _WORD_RE.findall(query.lower())
+    keywords = [w for w in words if w not in _STOPWORDS]
+    rewritten = [_SYNONYMS.get(w, w) for w in words]
+
+    variants = []
+    for variant in (" ".join(keywords), " ".join(rewritten)):
+        if variant and variant != query.lower() and variant not in variants:
+            variants.append(variant)
+    return tuple(variants)
+
+
+class TemplateMultiQueryRetriever(ParallelMultiQueryRetriever):
+    """
+    Multi-Query retriever that expands queries from templates instead of an
+    LLM call. Non-English queries still go through the LLM prompt, which
+    translates them for the search.
+    """
+
+    def generate_queries(self, question: str, run_manager) -> List[str]:
+        if not question.isascii():
+            return super().generate_queries(question, run_manager)
+        return list(expand_query(question))
+
+    async def agenerate_queries(
+        self,
+        question: str,
+        run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[str]:
+        if not question.isascii():
+            return await super().agenerate_queries(question, run_manager)
+        return list(expand_query(question))
+
+# Shared components, created once per process on first use (not at import,
+# so importing this module never fails on missing credentials or model files)
+@lru_cache(maxsize=None)
+def get_embeddings() -> GenAIEmbeddings:
+    return GenAIEmbeddings(model="gemini-embedding-001", dimensions=768)
+
+
+@lru_cache(maxsize=None)
+def get_llm() -> ChatGoogleGenerativeAI:
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash-lite",
+        google_api_key=settings.GOOGLE_API_KEY,
+        temperature=0.7,
+        streaming=True
+    )
+
+
+@lru_cache(maxsize=None)
+def get_reranker() -> OnnxCrossEncoderCompressor:
+    """Bundled int8 TinyBERT cross-encoder from model_cache (one ONNX session per process)"""
+    return OnnxCrossEncoderCompressor.from_model_dir(top_n=5)
+
+# Multi-Query expansion prompt
+QUERY_PROMPT = PromptTemplate(
+    input_variables=["question"],
+    template="""You are an AI language model assistant. Your task is to generate 
+    3 different versions of the given user question to retrieve relevant documents from a vector database. 
+    By generating multiple perspectives on the user question, your goal is to help the user overcome some of the limitations 
+    of distance-based similarity search. 
+    
+    IMPORTANT: If the user asks in a different language (e.g. Bengali), translate it to English for the search queries.
+    Also, think about synonyms (e.g. "birthday" -> "born on", "cost" -> "price").
     
-    # Initialize fresh vectorstore
-    vectorstore = PineconeVectorStore(
+    Provide these alternative questions separated by newlines.
+    Original question: {question}"""
+)
+
+
+@lru_cache(maxsize=128)
+def get_vectorstore(namespace: str) -> PineconeVectorStore:
+    """Get the Pinecone vector store for a namespace (one instance per namespace)"""
+    return PineconeVectorStore(
         index_name=settings.PINECONE_INDEX_NAME,
-        embedding=embeddings,
+        embedding=get_embeddings(),
         namespace=namespace,
         pinecone_api_key=settings.PINECONE_API_KEY,
         text_key="content"
     )
-    
-    base_retriever = vectorstore.as_retriever(
+
+
+# Retrieval routes, cheapest first
+ROUTE_NONE = "none"          # Chitchat: answer from the LLM + history only
+ROUTE_SIMPLE = "simple"      # Keyword lookup: single similarity search
+ROUTE_ADVANCED = "advanced"  # Everything else: Multi-Query + Rerank
+
+_CHITCHAT_RE = re.compile(
+    r"^(hi|hii+|hello|hey|yo|thanks|thank you|thx|ok|okay|cool|great|bye|goodbye|"
+    r"good (morning|afternoon|evening|night)|how are you|who are you)[\s!.?]*$",
+    re.IGNORECASE
+)
+
+
+def classify_query(query: str) -> str:
+    """
+    Decide how much retrieval a query needs using cheap heuristics.
+    Non-English queries always take the advanced route, whose expansion
+    prompt translates them for the search.
+    """
+    text = query.strip()
+    if not text or _CHITCHAT_RE.match(text):
+        return ROUTE_NONE
+    if text.isascii() and len(text.split()) <= 3 and "?" not in text:
+        return ROUTE_SIMPLE
+    return ROUTE_ADVANCED
+
+
+# File names the user mentions, either quoted or as a bare name.ext token
+_FILENAME_EXTENSIONS = r"(?:pdf|docx?|pptx?|xlsx?|csv|txt|md|json|html?)"
+_FILENAME_RE = re.compile(
+    rf"[\"'“‘]([^\"'”’\n]+?\.{_FILENAME_EXTENSIONS})[\"'”’]"
+    rf"|([\w\-.()]+\.{_FILENAME_EXTENSIONS})\b",
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=1024)
+def extract_filenames(query: str) -> Tuple[str, ...]:
+    """File names referenced in a query (cached, since queries repeat)"""
+    names = []
+    for quoted, bare in _FILENAME_RE.findall(query):
+        name = quoted or bare
+        if name not in names:
+            names.append(name)
+    return tuple(names)
+
+
+def get_metadata_filter(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Pinecone metadata filter for the query, applied server-side before the
+    ANN search. Only file names are extracted; modified_time is stored as
+    an ISO string, which Pinecone range operators cannot compare.
+    """
+    filenames = extract_filenames(query)
+    if not filenames:
+        return None
+    if len(filenames) == 1:
+        return {"filename": {"$eq": filenames[0]}}
+    return {"filename": {"$in": list(filenames)}}
+
+
+def get_simple_retriever(namespace: str, metadata_filter: Optional[Dict[str, Any]] = None):
+    """Single-query retriever (same shape as rag_chain.py), no expansion or rerank"""
+    search_kwargs = {"k": 5}
+    if metadata_filter:
+        search_kwargs["filter"] = metadata_filter
+    return get_vectorstore(namespace).as_retriever(
         search_type="similarity",
-        search_kwargs={"k": 10}  # Fetch more docs initially for Reranking
+        search_kwargs=search_kwargs
     )
-    
-    # Initialize fresh LLM
-    local_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite",
-        google_api_key=settings.GOOGLE_API_KEY,
-        temperature=0.7,
-        streaming=True
-    )
-    
-    # 1. Multi-Query Retriever (Query Expansion)
-    QUERY_PROMPT = PromptTemplate(
-        input_variables=["question"],
-        template="""You are an AI language model assistant. Your task is to generate 
-        3 different versions of the given user question to retrieve relevant documents from a vector database. 
-        By generating multiple perspectives on the user question, your goal is to help the user overcome some of the limitations 
-        of distance-based similarity search. 
-        
-        IMPORTANT: If the user asks in a different language (e.g. Bengali), translate it to English for the search queries.
-        Also, think about synonyms (e.g. "birthday" -> "born on", "cost" -> "price").
-        
-        Provide these alternative questions separated by newlines.
-        Original question: {question}"""
+
+
+def get_advanced_retriever(namespace: str, metadata_filter: Optional[Dict[str, Any]] = None):
+    """
+    Creates an advanced retriever pipeline:
+    1. Multi-Query Retriever (Template Expansion) -> Gets ~10 docs per variant
+    2. ONNX Cross-Encoder Reranker (Compression) -> Selects Top 5
+    """
+    search_kwargs = {"k": 10}  # Fetch more docs initially for Reranking
+    if metadata_filter:
+        search_kwargs["filter"] = metadata_filter
+    base_retriever = get_vectorstore(namespace).as_retriever(
+        search_type="similarity",
+        search_kwargs=search_kwargs
     )
     
-    multi_query_retriever = MultiQueryRetriever.from_llm(
+    # 1. Multi-Query Retriever (Query Expansion, templated; LLM only for translation)
+    multi_query_retriever = TemplateMultiQueryRetriever.from_llm(
         retriever=base_retriever,
-        llm=local_llm,
+        llm=get_llm(),
         prompt=QUERY_PROMPT,
         parser_key="lines",
         include_original=True
     )
     
-    # 2. FlashRank Reranker (Contextual Compression)
-    # Use local cache to avoid /tmp issues by instantiating Ranker directly
-    from flashrank import Ranker
-    ranker_client = Ranker(
-        model_name="ms-marco-TinyBERT-L-2-v2",
-        cache_dir="model_cache"
-    )
-    
-    compressor = FlashrankRerank(
-        client=ranker_client,
-        top_n=5
-    )
-    
+    # 2. Cross-Encoder Reranker (Contextual Compression)
     compression_retriever = ContextualCompressionRetriever(
-        base_compressor=compressor,
+        base_compressor=get_reranker(),
         base_retriever=multi_query_retriever
     )
     
     return compression_retriever
 
-def get_advanced_rag_chain(session_id: str, namespace: str = "documents") -> ConversationalRetrievalChain:
-    """Get or create Advanced RAG chain for a session"""
-    
-    # Note: We don't cache chains here anymore because we want fresh sessions per request
-    # Since we are re-initing components, we'll build a fresh chain.
-    # But we CAN cache memory.
-    
-    logger.info(f"🚀 Initializing Advanced RAG Chain for session: {session_id}")
+def get_advanced_rag_chain(
+    session_id: str,
+    namespace: str = "documents",
+    route: str = ROUTE_ADVANCED,
+    metadata_filter: Optional[Dict[str, Any]] = None
+) -> ConversationalRetrievalChain:
+    """Build an Advanced RAG chain for a session from the shared components"""
     
-    retriever = get_advanced_retriever(namespace)
-    memory = get_memory(session_id)
+    logger.debug("🚀 Initializing Advanced RAG Chain (%s) for session: %s", route, session_id)
     
-    # Initialize fresh LLM for QA
-    # Initialize fresh LLM for QA
-    qa_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-lite",
-        google_api_key=settings.GOOGLE_API_KEY,
-        temperature=0.7,
-        streaming=True
-    )
+    if route == ROUTE_SIMPLE:
+        retriever = get_simple_retriever(namespace, metadata_filter)
+    else:
+        retriever = get_advanced_retriever(namespace, metadata_filter)
+    memory = get_memory(session_id, get_llm())
     
     chain = ConversationalRetrievalChain.from_llm(
-        llm=qa_llm,
+        llm=get_llm(),
         retriever=retriever,
         memory=memory,
         return_source_documents=True,
@@ -171,10 +420,51 @@ def get_advanced_rag_chain(session_id: str, namespace: str = "documents") -> Con
     return chain
 
 
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+# Representative queries used to warm caches on startup
+WARMUP_QUERIES = [
+    "What were the action items from the last meeting?",
+    "Summarize the project budget",
+    "Who is responsible for the deadline?",
+]
+
+
+async def warmup(namespace: str = "documents"):
+    """
+    Prime the retrieval path without calling the LLM: pushes the reranker
+    through a forward pass, then embeds the warmup queries and runs Pinecone
+    searches so the first user query does not pay cold-start costs.
+    """
+    # Call the model directly so warmup pairs stay out of the score cache
+    passages = [f"Meeting notes: {q}" for q in WARMUP_QUERIES]
+    # Loading the ONNX session is blocking too, so it happens off the loop
+    reranker = await asyncio.to_thread(get_reranker)
+    await asyncio.to_thread(
+        reranker.score_requests, [(q, passages) for q in WARMUP_QUERIES]
+    )
+    logger.info("🔥 Reranker warmed up")
+    
+    # Vector store construction does a blocking index lookup
+    vectorstore = await asyncio.to_thread(get_vectorstore, namespace)
+    await asyncio.gather(*[
+        vectorstore.asimilarity_search(q, k=5) for q in WARMUP_QUERIES
+    ])
+    logger.info("🔥 Retriever warmed up")
+
+
+async def answer_without_retrieval(query: str, session_id: str) -> Dict[str, Any]:
+    """Answer directly from the LLM and conversation history, skipping retrieval"""
+    memory = get_memory(session_id, get_llm())
+    history = memory.load_memory_variables({})["chat_history"]
+    
+    response = await get_llm().ainvoke([*history, HumanMessage(content=query)])
+    await memory.asave_context({"question": query}, {"answer": response.content})
+    
+    return {
+        "answer": response.content,
+        "sources": [],
+        "session_id": session_id
+    }
 
-executor = ThreadPoolExecutor(max_workers=5)
 
 async def query_with_advanced_memory(
     query: str,
@@ -182,55 +472,59 @@ async def query_with_advanced_memory(
     namespace: str = "documents"
 ) -> Dict[str, Any]:
     """
-    Query documents using Advanced RAG (Multi-Query + FlashRank)
-    Uses synchronous chain execution in a thread pool to avoid async session issues.
+    Query documents using Advanced RAG (Multi-Query + Cross-Encoder Rerank)
+    Runs the chain natively on the event loop so sub-queries fan out concurrently.
+    Chitchat and short keyword queries are routed to cheaper paths first.
     """
+    route = classify_query(query)
     
-    def run_sync_chain():
-        # Initialize chain inside the thread to ensure thread-local safety if needed
-        chain = get_advanced_rag_chain(session_id, namespace)
-        return chain.invoke({"question": query})
-
-    loop = asyncio.get_running_loop()
-    # Run the synchronous chain.invoke in a thread pool
-    result = await loop.run_in_executor(executor, run_sync_chain)
+    if route == ROUTE_NONE:
+        return await answer_without_retrieval(query, session_id)
+    
+    metadata_filter = get_metadata_filter(query)
+    if metadata_filter:
+        logger.debug("🔎 Filtering search to: %s", metadata_filter)
+    
+    chain = get_advanced_rag_chain(session_id, namespace, route, metadata_filter)
+    result = await chain.ainvoke({"question": query})
     
     # Extract source documents with type sanitization
     sources = []
     if "source_documents" in result:
-        print(f"📄 Top {len(result['source_documents'])} Chunks for: '{query}'")
+        log_chunks = logger.isEnabledFor(logging.DEBUG)
+        if log_chunks:
+            logger.debug("📄 Top %s Chunks for: '%s'", len(result["source_documents"]), query)
         for i, doc in enumerate(result["source_documents"]):
             # Sanitize metadata to remove numpy types and cleanup filenames
-            metadata = {}
-            for k, v in doc.metadata.items():
-                if hasattr(v, 'item'):
-                     metadata[k] = v.item()
-                else:
-                     metadata[k] = v
+            metadata = {
+                k: v.item() if isinstance(v, np.generic) else v
+                for k, v in doc.metadata.items()
+            }
             
             # Force clean filename (no URLs)
-            clean_name = "Document"
-            possible_names = [
-                metadata.get('filename'),
-                metadata.get('title'),
-                metadata.get('name')
-            ]
-            
-            for name in possible_names:
-                if name and isinstance(name, str):
-                    name_str = name.strip()
-                    if name_str and not name_str.startswith('http') and name_str.lower() != 'unknown':
-                        clean_name = name_str
-                        break
+            clean_name = next(
+                (
+                    name_str for name in (
+                        metadata.get('filename'),
+                        metadata.get('title'),
+                        metadata.get('name')
+                    )
+                    if isinstance(name, str) and (name_str := name.strip())
+                    and not name_str.startswith('http') and name_str.lower() != 'unknown'
+                ),
+                "Document"
+            )
             
             # Ensure filename is set to the clean name
             metadata['filename'] = clean_name
             
             # Remove source if it is a URL to prevent frontend fallback from using it
-            if metadata.get('source', '').startswith('http'):
+            source = metadata.get('source')
+            if isinstance(source, str) and source.startswith('http'):
                 metadata['source'] = clean_name
             
-            print(f"[{i}] {metadata.get('filename')} (Content: {doc.page_content[:100]}...)")
+            if log_chunks:
+                logger.debug("[%s] %s (Content: %s...)", i, clean_name, doc.page_content[:100])
             
             sources.append({
                 "content": doc.page_content,
@@ -242,3 +536,100 @@ async def query_with_advanced_memory(
         "sources": sources,
         "session_id": session_id
     }
+
+
+async def _produce_answer(prompt: Any, queue: asyncio.Queue):
+    """Stream LLM output into a queue, ending with a None sentinel"""
+    try:
+        async for chunk in get_llm().astream(prompt):
+            if chunk.content:
+                await queue.put(chunk.content)
+    finally:
+        queue.put_nowait(None)
+
+
+def _format_qa_prompt(docs: List[Document], question: str) -> str:
+    """Format the QA prompt the same way the stuff-documents chain does"""
+    context = "\n\n".join(doc.page_content for doc in docs)
+    return QA_PROMPT.format(context=context, question=question)
+
+
+async def astream_with_advanced_memory(
+    query: str,
+    session_id: str,
+    namespace: str = "documents"
+) -> AsyncIterator[str]:
+    """
+    Stream an Advanced RAG answer chunk by chunk.
+    Synthesis starts speculatively on the first-stage candidates while the
+    reranker runs; the speculative answer is kept if the reranked top document
+    is the same, otherwise it is cancelled and restarted on the reranked set.
+    """
+    memory = get_memory(session_id, get_llm())
+    history = memory.load_memory_variables({})["chat_history"]
+    route = classify_query(query)
+    metadata_filter = get_metadata_filter(query)
+    
+    producer = rerank_task = None
+    queue: asyncio.Queue = asyncio.Queue()
+    answer_parts = []
+    
+    try:
+        if route == ROUTE_NONE:
+            producer = asyncio.create_task(
+                _produce_answer([*history, HumanMessage(content=query)], queue)
+            )
+        else:
+            # Condense follow-ups into a standalone question, as ConversationalRetrievalChain does
+            question = query
+            if history:
+                condensed = await get_llm().ainvoke(CONDENSE_QUESTION_PROMPT.format(
+                    chat_history=get_buffer_string(history),
+                    question=query
+                ))
+                question = condensed.content
+            
+            if route == ROUTE_SIMPLE:
+                docs = await get_simple_retriever(namespace, metadata_filter).ainvoke(question)
+                producer = asyncio.create_task(
+                    _produce_answer(_format_qa_prompt(docs, question), queue)
+                )
+            else:
+                retriever = get_advanced_retriever(namespace, metadata_filter)
+                compressor = retriever.base_compressor
+                candidates = await retriever.base_retriever.ainvoke(question)
+                
+                # Rerank and speculatively synthesize from the unreranked candidates at once
+                rerank_task = asyncio.create_task(
+                    compressor.acompress_documents(candidates, question)
+                )
+                speculative_docs = candidates[:compressor.top_n]
+                producer = asyncio.create_task(
+                    _produce_answer(_format_qa_prompt(speculative_docs, question), queue)
+                )
+                
+                reranked = await rerank_task
+                same_top = (
+                    reranked and speculative_docs
+                    and reranked[0].page_content == speculative_docs[0].page_content
+                )
+                if not same_top:
+                    producer.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await producer
+                    queue = asyncio.Queue()
+                    producer = asyncio.create_task(
+                        _produce_answer(_format_qa_prompt(reranked, question), queue)
+                    )
+        
+        while (chunk := await queue.get()) is not None:
+            answer_parts.append(chunk)
+            yield chunk
+        await producer  # Surface LLM errors
+    finally:
+        # Errors and client disconnects close the generator; stop in-flight work
+        for task in (producer, rerank_task):
+            if task is not None and not task.done():
+                task.cancel()
+    
+    await memory.asave_context({"question": query}, {"answer": "".join(answer_parts)})
@@ -1,11 +1,28 @@
-from typing import Dict, List, Any
-from langchain.memory import ConversationBufferWindowMemory
+from typing import Dict, List, Any, Sequence
+import threading
+from cachetools import TTLCache
+from langchain.memory import ConversationSummaryBufferMemory
 from langchain.prompts import PromptTemplate
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage
 from langchain.chains import ConversationalRetrievalChain
 
+# Session stores are bounded; sessions idle for longer than the TTL are evicted
+SESSION_CACHE_SIZE = 10_000
+SESSION_TTL_SECONDS = 3600
+
 # Store session memories and chains
-session_memories: Dict[str, ConversationBufferWindowMemory] = {}
-session_chains: Dict[str, ConversationalRetrievalChain] = {}
+session_memories: TTLCache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TTL_SECONDS)
+session_chains: TTLCache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TTL_SECONDS)
+session_lock = threading.RLock()
+
+# /chat/stream (rag_chain.py) sessions live here too, so clearing history
+# does not have to import that module and build its Gemini clients
+stream_session_memories: TTLCache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TTL_SECONDS)
+stream_session_chains: TTLCache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TTL_SECONDS)
+
+# Chat history budget: older turns are folded into a running summary
+MEMORY_MAX_TOKENS = 512
 
 # Custom prompt for better synthesis
 QA_PROMPT = PromptTemplate.from_template("""You are a helpful AI assistant. Use the following pieces of context from the user's documents to answer the question. 
@@ -25,37 +42,81 @@ Question: {question}
 
 Answer:""")
 
-def get_memory(session_id: str) -> ConversationBufferWindowMemory:
-    """Get or create memory for a session"""
-    if session_id not in session_memories:
-        session_memories[session_id] = ConversationBufferWindowMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="answer",
-            k=10  # Keep last 10 conversation turns
-        )
-    return session_memories[session_id]
+class SummaryBufferMemory(ConversationSummaryBufferMemory):
+    """
+    Summary buffer memory that estimates tokens locally (~4 chars per token)
+    instead of calling the model's count_tokens API on every turn, and always
+    keeps the latest turn verbatim.
+    """
+
+    def estimate_tokens(self, messages: Sequence[BaseMessage]) -> int:
+        return sum(len(str(msg.content)) for msg in messages) // 4
+
+    def pop_over_limit(self) -> List[BaseMessage]:
+        """Remove the oldest turns (question + answer) until the buffer fits the token budget"""
+        buffer = self.chat_memory.messages
+        pruned = []
+        while len(buffer) > 2 and self.estimate_tokens(buffer) > self.max_token_limit:
+            pruned.extend(buffer[:2])
+            del buffer[:2]
+        return pruned
+
+    def prune(self) -> None:
+        pruned = self.pop_over_limit()
+        if pruned:
+            self.moving_summary_buffer = self.predict_new_summary(
+                pruned, self.moving_summary_buffer
+            )
+
+    async def aprune(self) -> None:
+        pruned = self.pop_over_limit()
+        if pruned:
+            self.moving_summary_buffer = await self.apredict_new_summary(
+                pruned, self.moving_summary_buffer
+            )
+
+def get_memory(session_id: str, llm: BaseLanguageModel) -> SummaryBufferMemory:
+    """Get or create memory for a session (llm writes the rolling summary)"""
+    with session_lock:
+        memory = session_memories.get(session_id)
+        if memory is None:
+            memory = SummaryBufferMemory(
+                llm=llm,
+                memory_key="chat_history",
+                return_messages=True,
+                output_key="answer",
+                max_token_limit=MEMORY_MAX_TOKENS
+            )
+        # Re-insert on every access so the TTL tracks idle time
+        session_memories[session_id] = memory
+        return memory
+
+def _clear_session(memories: TTLCache, chains: TTLCache, session_id: str) -> bool:
+    with session_lock:
+        memory = memories.pop(session_id, None)
+        if memory is not None:
+            memory.clear()
+        
+        # Also clear cached chains
+        keys_to_remove = [k for k in chains.keys() if k.startswith(f"{session_id}:")]
+        for key in keys_to_remove:
+            chains.pop(key, None)
+    
+    return memory is not None
 
 def clear_session_memory(session_id: str) -> bool:
     """Clear memory for a specific session"""
-    cleared = False
-    
-    if session_id in session_memories:
-        session_memories[session_id].clear()
-        del session_memories[session_id]
-        cleared = True
-    
-    # Also clear cached chains
-    keys_to_remove = [k for k in session_chains.keys() if k.startswith(f"{session_id}:")]
-    for key in keys_to_remove:
-        del session_chains[key]
-    
-    return cleared
+    return _clear_session(session_memories, session_chains, session_id)
+
+def clear_stream_session_memory(session_id: str) -> bool:
+    """Clear memory for a specific /chat/stream session"""
+    return _clear_session(stream_session_memories, stream_session_chains, session_id)
 
 def get_session_history(session_id: str) -> List[Dict[str, str]]:
     """Get conversation history for a session"""
-    if session_id in session_memories:
-        memory = session_memories[session_id]
+    with session_lock:
+        memory = session_memories.get(session_id)
+    if memory is not None:
         messages = memory.chat_memory.messages
         return [
             {
@@ -68,4 +129,5 @@ def get_session_history(session_id: str) -> List[Dict[str, str]]:
 
 def get_all_sessions() -> List[str]:
     """Get list of all active session IDs"""
-    return list(session_memories.keys())
+    with session_lock:
+        return list(session_memories.keys())
@@ -4,6 +4,7 @@ Using official langchain-pinecone package
 """
 
 from typing import Dict, List, Optional, Any
+from functools import lru_cache
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain.chains import ConversationalRetrievalChain
@@ -11,6 +12,12 @@ from langchain.memory import ConversationBufferWindowMemory
 from langchain.prompts import PromptTemplate
 
 from app.config import settings
+from app.chains.chain_utils import (
+    clear_stream_session_memory,
+    session_lock,
+    stream_session_chains as session_chains,
+    stream_session_memories as session_memories,
+)
 
 # Initialize LLM
 llm = ChatGoogleGenerativeAI(
@@ -28,10 +35,6 @@ embeddings = GoogleGenerativeAIEmbeddings(
     output_dimensionality=768
 )
 
-# Store session memories and chains
-session_memories: Dict[str, ConversationBufferWindowMemory] = {}
-session_chains: Dict[str, ConversationalRetrievalChain] = {}
-
 # Custom prompt for better synthesis
 QA_PROMPT = PromptTemplate.from_template("""You are a helpful AI assistant. Use the following pieces of context from the user's documents to answer the question. 
 If you don't know the answer based on the context, just say that you don't have that information in your documents.
@@ -51,8 +54,9 @@ Question: {question}
 Answer:""")
 
 
+@lru_cache(maxsize=128)
 def get_vectorstore(namespace: str) -> PineconeVectorStore:
-    """Get Pinecone vector store for a namespace using official package"""
+    """Get Pinecone vector store for a namespace (one instance per namespace, shared by sessions)"""
     return PineconeVectorStore(
         index_name=settings.PINECONE_INDEX_NAME,
         embedding=embeddings,
@@ -64,14 +68,18 @@ def get_vectorstore(namespace: str) -> PineconeVectorStore:
 
 def get_memory(session_id: str) -> ConversationBufferWindowMemory:
     """Get or create memory for a session"""
-    if session_id not in session_memories:
-        session_memories[session_id] = ConversationBufferWindowMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="answer",
-            k=10  # Keep last 10 conversation turns
-        )
-    return session_memories[session_id]
+    with session_lock:
+        memory = session_memories.get(session_id)
+        if memory is None:
+            memory = ConversationBufferWindowMemory(
+                memory_key="chat_history",
+                return_messages=True,
+                output_key="answer",
+                k=10  # Keep last 10 conversation turns
+            )
+        # Re-insert on every access so the TTL tracks idle time
+        session_memories[session_id] = memory
+        return memory
 
 
 def get_rag_chain(session_id: str, namespace: str = "documents") -> ConversationalRetrievalChain:
@@ -80,8 +88,13 @@ def get_rag_chain(session_id: str, namespace: str = "documents") -> Conversation
     chain_key = f"{session_id}:{namespace}"
     
     # Reuse existing chain if same namespace
-    if chain_key in session_chains:
-        return session_chains[chain_key]
+    with session_lock:
+        chain = session_chains.get(chain_key)
+        if chain is not None:
+            # Refresh TTLs so the chain and its memory expire together
+            session_chains[chain_key] = chain
+            session_memories[session_id] = chain.memory
+            return chain
     
     # Create vectorstore and retriever using official langchain-pinecone
     vectorstore = get_vectorstore(namespace)
@@ -101,7 +114,8 @@ def get_rag_chain(session_id: str, namespace: str = "documents") -> Conversation
         verbose=False
     )
     
-    session_chains[chain_key] = chain
+    with session_lock:
+        session_chains[chain_key] = chain
     return chain
 
 
@@ -116,8 +130,8 @@ async def query_with_memory(
     """
     chain = get_rag_chain(session_id, namespace)
     
-    # Run the chain
-    result = chain.invoke({"question": query})
+    # Run the chain natively on the event loop
+    result = await chain.ainvoke({"question": query})
     
     # Extract source documents
     sources = []
@@ -137,25 +151,14 @@ async def query_with_memory(
 
 def clear_session_memory(session_id: str) -> bool:
     """Clear memory for a specific session"""
-    cleared = False
-    
-    if session_id in session_memories:
-        session_memories[session_id].clear()
-        del session_memories[session_id]
-        cleared = True
-    
-    # Also clear cached chains
-    keys_to_remove = [k for k in session_chains.keys() if k.startswith(f"{session_id}:")]
-    for key in keys_to_remove:
-        del session_chains[key]
-    
-    return cleared
+    return clear_stream_session_memory(session_id)
 
 
 def get_session_history(session_id: str) -> List[Dict[str, str]]:
     """Get conversation history for a session"""
-    if session_id in session_memories:
-        memory = session_memories[session_id]
+    with session_lock:
+        memory = session_memories.get(session_id)
+    if memory is not None:
         messages = memory.chat_memory.messages
         return [
             {
@@ -169,4 +172,5 @@ def get_session_history(session_id: str) -> List[Dict[str, str]]:
 
 def get_all_sessions() -> List[str]:
     """Get list of all active session IDs"""
-    return list(session_memories.keys())
+    with session_lock:
+        return list(session_memories.keys())
@@ -0,0 +1,320 @@
+"""
+ONNX Cross-Encoder Reranker
+- Scores every (query, passage) pair in a single ONNX Runtime call
+- Runs the bundled TinyBERT cross-encoder, which ships int8-quantized
+- Caches scores so repeated (query, passage) pairs skip the model
+- Tokenizes the query once per request and reuses cached passage tokens
+- Coalesces concurrent async rerank calls into one batched forward pass
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import os
+import hashlib
+import logging
+import threading
+
+import numpy as np
+import onnxruntime as ort
+from cachetools import LRUCache
+from tokenizers import Tokenizer
+from pydantic import ConfigDict, PrivateAttr
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.join("model_cache", "ms-marco-TinyBERT-L-2-v2")
+MODEL_FILE = "flashrank-TinyBERT-L-2-v2.onnx"
+MAX_LENGTH = 512
+
+# Dynamic batching: wait up to 5ms for more requests, or until 64 pairs are queued
+BATCH_WINDOW_SECONDS = 0.005
+MAX_BATCH_PAIRS = 64
+
+# Reranker score cache: fingerprint(query, passage) -> relevance score
+score_cache: LRUCache = LRUCache(maxsize=50_000)
+_score_cache_lock = threading.Lock()
+
+# Passage token cache: digest(passage) -> token ids (no special tokens)
+passage_token_cache: LRUCache = LRUCache(maxsize=20_000)
+_passage_token_lock = threading.Lock()
+
+
+def get_score_key(query: str, passage: str) -> bytes:
+    """
+    Fingerprint a (query, passage) pair for the score cache.
+    Keyed on passage text rather than vector ID because re-indexed Drive
+    files reuse their IDs with new content.
+    """
+    h = hashlib.blake2b(query.encode(), digest_size=16)
+    h.update(b"\x00")
+    h.update(passage.encode())
+    return h.digest()
+
+
+def encode_pairs(
+    pairs: Sequence[Tuple[List[int], List[int]]],
+    cls_id: int,
+    sep_id: int,
+    max_length: int = MAX_LENGTH
+) -> Dict[str, np.ndarray]:
+    """
+    Fuse pre-tokenized (query, passage) ids into padded model inputs:
+    [CLS] query [SEP] passage [SEP], truncating the longer side first.
+    """
+    budget = max_length - 3
+    fused = []
+    for query_ids, passage_ids in pairs:
+        query_len = min(len(query_ids), max(budget - len(passage_ids), budget // 2))
+        passage_len = min(len(passage_ids), budget - query_len)
+        fused.append((query_ids[:query_len], passage_ids[:passage_len]))
+
+    width = max(len(q) + len(p) + 3 for q, p in fused)
+    input_ids = np.zeros((len(fused), width), dtype=np.int64)
+    attention_mask = np.zeros((len(fused), width), dtype=np.int64)
+    token_type_ids = np.zeros((len(fused), width), dtype=np.int64)
+
+    for row, (q, p) in enumerate(fused):
+        n = len(q) + len(p) + 3
+        input_ids[row, :n] = [cls_id, *q, sep_id, *p, sep_id]
+        attention_mask[row, :n] = 1
+        token_type_ids[row, len(q) + 2:n] = 1
+
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "token_type_ids": token_type_ids,
+    }
+
+
+class RerankerBatcher:
+    """
+    Dynamic batcher for the cross-encoder. Concurrent requests queue their
+    (query, passages) and await a future; a background task drains the
+    queue and scores everything it collected in one model call.
+    """
+
+    def __init__(
+        self,
+        compressor: "OnnxCrossEncoderCompressor",
+        window: float = BATCH_WINDOW_SECONDS,
+        max_pairs: int = MAX_BATCH_PAIRS
+    ):
+        self.compressor = compressor
+        self.window = window
+        self.max_pairs = max_pairs
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self) -> None:
+        """Start the drain task on the running loop (restarting it if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._drain())
+
+    async def score(self, query: str, passages: Sequence[str]) -> np.ndarray:
+        """Score passages for a query as part of the next batch"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((query, passages, future))
+        return await future
+
+    async def _drain(self) -> None:
+        queue = self._queue
+        loop = self._loop
+        while True:
+            batch = [await queue.get()]
+            pairs = len(batch[0][1])
+            deadline = loop.time() + self.window
+
+            while pairs < self.max_pairs:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                pairs += len(item[1])
+
+            try:
+                results = await asyncio.to_thread(
+                    self.compressor.score_requests,
+                    [(query, passages) for query, passages, _ in batch]
+                )
+            except Exception as e:
+                logger.error("❌ Reranker batch failed: %s", e)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            logger.debug("Reranked %s pairs for %s requests in one batch", pairs, len(batch))
+            for (_, _, future), scores in zip(batch, results):
+                if not future.done():
+                    future.set_result(scores)
+
+
+class OnnxCrossEncoderCompressor(BaseDocumentCompressor):
+    """Rerank documents with an ONNX cross-encoder and keep the top N."""
+
+    session: Any
+    tokenizer: Any
+    top_n: int = 5
+    cls_id: int = 101
+    sep_id: int = 102
+
+    _batcher: Optional[RerankerBatcher] = PrivateAttr(default=None)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @classmethod
+    def from_model_dir(cls, model_dir: str = MODEL_DIR, top_n: int = 5) -> "OnnxCrossEncoderCompressor":
+        """Load the ONNX session and tokenizer from a local model directory"""
+        # The FlashRank export is already dynamically quantized (MatMulInteger)
+        session = ort.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE),
+            providers=["CPUExecutionProvider"]
+        )
+
+        tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=MAX_LENGTH)
+
+        return cls(
+            session=session,
+            tokenizer=tokenizer,
+            top_n=top_n,
+            cls_id=tokenizer.token_to_id("[CLS]"),
+            sep_id=tokenizer.token_to_id("[SEP]")
+        )
+
+    def get_passage_ids(self, passages: Sequence[str]) -> List[List[int]]:
+        """Token ids for each passage, tokenizing only passages not seen before"""
+        keys = [hashlib.blake2b(p.encode(), digest_size=16).digest() for p in passages]
+        with _passage_token_lock:
+            ids = [passage_token_cache.get(key) for key in keys]
+
+        misses = [i for i, cached in enumerate(ids) if cached is None]
+        if misses:
+            encodings = self.tokenizer.encode_batch(
+                [passages[i] for i in misses], add_special_tokens=False
+            )
+            with _passage_token_lock:
+                for i, encoding in zip(misses, encodings):
+                    ids[i] = passage_token_cache[keys[i]] = encoding.ids
+
+        return ids
+
+    def score_requests(
+        self,
+        requests: Sequence[Tuple[str, Sequence[str]]]
+    ) -> List[np.ndarray]:
+        """
+        Score several (query, passages) requests with one batched forward
+        pass, returning one score array per request.
+        """
+        pairs = []
+        for query, passages in requests:
+            # Tokenize each query once and pair it with every passage
+            query_ids = self.tokenizer.encode(query, add_special_tokens=False).ids
+            pairs.extend((query_ids, ids) for ids in self.get_passage_ids(passages))
+
+        feeds = encode_pairs(pairs, self.cls_id, self.sep_id)
+        logits = self.session.run(None, feeds)[0]
+
+        # Single-logit relevance head -> sigmoid
+        scores = 1 / (1 + np.exp(-logits[:, 0]))
+
+        offsets = np.cumsum([len(passages) for _, passages in requests])[:-1]
+        return np.split(scores, offsets)
+
+    def score(self, query: str, passages: Sequence[str]) -> np.ndarray:
+        """Score all (query, passage) pairs with one batched forward pass"""
+        return self.score_requests([(query, passages)])[0]
+
+    def get_cached_scores(
+        self,
+        documents: Sequence[Document],
+        query: str
+    ) -> Tuple[List[bytes], List[Optional[float]]]:
+        """Score cache keys and cached scores (None on a miss) for each document"""
+        keys = [get_score_key(query, doc.page_content) for doc in documents]
+        with _score_cache_lock:
+            cached = [score_cache.get(key) for key in keys]
+        return keys, cached
+
+    def select_top(
+        self,
+        documents: Sequence[Document],
+        keys: List[bytes],
+        cached: List[Optional[float]],
+        misses: List[int],
+        new_scores: Sequence[float]
+    ) -> List[Document]:
+        """Store freshly computed scores and return the top N documents"""
+        with _score_cache_lock:
+            for i, score in zip(misses, new_scores):
+                cached[i] = score_cache[keys[i]] = float(score)
+
+        scores = np.array(cached)
+        top = np.argsort(-scores)[:self.top_n]
+
+        return [
+            Document(
+                id=documents[i].id,
+                page_content=documents[i].page_content,
+                metadata={**documents[i].metadata, "relevance_score": float(scores[i])}
+            )
+            for i in top
+        ]
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None
+    ) -> List[Document]:
+        """Return the top N documents by cross-encoder relevance"""
+        if not documents:
+            return []
+
+        keys, cached = self.get_cached_scores(documents, query)
+
+        # Only run the model on cache misses, in one batch
+        misses = [i for i, score in enumerate(cached) if score is None]
+        new_scores = []
+        if misses:
+            new_scores = self.score(query, [documents[i].page_content for i in misses])
+
+        return self.select_top(documents, keys, cached, misses, new_scores)
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None
+    ) -> List[Document]:
+        """
+        Async rerank: cache misses join the shared batcher so concurrent
+        requests share one forward pass off the event loop.
+        """
+        if not documents:
+            return []
+
+        keys, cached = self.get_cached_scores(documents, query)
+
+        misses = [i for i, score in enumerate(cached) if score is None]
+        new_scores = []
+        if misses:
+            if self._batcher is None:
+                self._batcher = RerankerBatcher(self)
+            new_scores = await self._batcher.score(
+                query, [documents[i].page_content for i in misses]
+            )
+
+        return self.select_top(documents, keys, cached, misses, new_scores)
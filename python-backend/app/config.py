@@ -33,6 +33,16 @@ class Settings(BaseSettings):
     PINECONE_INDEX_NAME: str = "siat"
     SERP_API_KEY: str = ""
     
+    # Local SQLite ledger of indexed Drive files (skips Pinecone lookups on re-sync)
+    INGEST_LEDGER_PATH: str = "ingest_ledger.db"
+    
+    # Serve /search from cached results of near-identical query embeddings
+    # (opt-in: a hit can answer a slightly different query with its results)
+    SEARCH_CACHE_ENABLED: bool = False
+    
+    # Log level for app loggers (DEBUG shows per-request progress)
+    LOG_LEVEL: str = "INFO"
+    
     # URLs for OAuth redirect flow
     BACKEND_URL: str = "http://localhost:3001"
     FRONTEND_URL: str = "http://localhost:5000"
@@ -0,0 +1,154 @@
+"""Shared HTTP clients (one connection pool per upstream host)"""
+
+from typing import Optional
+import asyncio
+import random
+import httpx
+
+from app.config import settings
+
+# Keep-alive pools sized for concurrent Drive syncs
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+# Pinecone takes bursts of parallel upserts/fetches from concurrent syncs;
+# fail fast on connect and pool waits, allow longer reads/writes
+PINECONE_LIMITS = httpx.Limits(max_connections=256, max_keepalive_connections=128)
+PINECONE_TIMEOUT = httpx.Timeout(connect=5.0, read=30.0, write=30.0, pool=5.0)
+
+# SerpAPI sees a handful of concurrent searches; its own small pool
+SERP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
+# Token exchanges are low-volume; keep a few warm connections to Google OAuth
+OAUTH_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+# Google APIs only gzip responses when the User-Agent also contains "gzip"
+DRIVE_HEADERS = {
+    "Accept-Encoding": "gzip",
+    "User-Agent": "friday-backend (gzip)",
+}
+
+# Retries for throttled (429) and failed (5xx / connection) requests
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 10.0
+
+_drive_client: Optional[httpx.AsyncClient] = None
+_pinecone_client: Optional[httpx.AsyncClient] = None
+_oauth_client: Optional[httpx.AsyncClient] = None
+_scrape_client: Optional[httpx.AsyncClient] = None
+_serp_client: Optional[httpx.AsyncClient] = None
+
+
+def get_drive_client() -> httpx.AsyncClient:
+    """Get or create the shared Google Drive API client (HTTP/2)"""
+    global _drive_client
+    if _drive_client is None or _drive_client.is_closed:
+        _drive_client = httpx.AsyncClient(
+            http2=True,
+            limits=HTTP_LIMITS,
+            timeout=30.0,
+            headers=DRIVE_HEADERS
+        )
+    return _drive_client
+
+
+def get_pinecone_client() -> httpx.AsyncClient:
+    """
+    Get or create the shared Pinecone data-plane client (HTTP/2). Requests
+    use paths relative to the index host; the API key is a default header.
+    """
+    global _pinecone_client
+    if _pinecone_client is None or _pinecone_client.is_closed:
+        _pinecone_client = httpx.AsyncClient(
+            http2=True,
+            base_url=settings.PINECONE_INDEX_HOST,
+            headers={
+                "Api-Key": settings.PINECONE_API_KEY,
+                "Content-Type": "application/json"
+            },
+            limits=PINECONE_LIMITS,
+            timeout=PINECONE_TIMEOUT
+        )
+    return _pinecone_client
+
+
+def get_oauth_client() -> httpx.AsyncClient:
+    """Get or create the shared Google OAuth token endpoint client (HTTP/2)"""
+    global _oauth_client
+    if _oauth_client is None or _oauth_client.is_closed:
+        _oauth_client = httpx.AsyncClient(http2=True, limits=OAUTH_LIMITS, timeout=10.0)
+    return _oauth_client
+
+
+def get_scrape_client() -> httpx.AsyncClient:
+    """Get or create the shared client for fetching arbitrary web pages"""
+    global _scrape_client
+    if _scrape_client is None or _scrape_client.is_closed:
+        _scrape_client = httpx.AsyncClient(
+            http2=True,
+            limits=HTTP_LIMITS,
+            timeout=20.0,
+            headers={"User-Agent": "Friday/1.0"},
+            follow_redirects=True
+        )
+    return _scrape_client
+
+
+def get_serp_client() -> httpx.AsyncClient:
+    """Get or create the shared SerpAPI client (HTTP/2)"""
+    global _serp_client
+    if _serp_client is None or _serp_client.is_closed:
+        _serp_client = httpx.AsyncClient(http2=True, limits=SERP_LIMITS, timeout=20.0)
+    return _serp_client
+
+
+async def close_http_clients():
+    """Close the shared clients (called on shutdown)"""
+    global _drive_client, _pinecone_client, _oauth_client, _scrape_client, _serp_client
+    for client in (_drive_client, _pinecone_client, _oauth_client, _scrape_client, _serp_client):
+        if client is not None:
+            await client.aclose()
+    _drive_client = None
+    _pinecone_client = None
+    _oauth_client = None
+    _scrape_client = None
+    _serp_client = None
+
+
+def is_retryable(status_code: int) -> bool:
+    """Throttled or server-side failures worth retrying"""
+    return status_code == 429 or status_code >= 500
+
+
+def retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Seconds to wait before the next attempt: Retry-After, else exponential backoff with jitter"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+async def request_with_retry(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    **kwargs
+) -> httpx.Response:
+    """
+    Send a request, retrying 429/5xx responses and connection errors up to
+    MAX_ATTEMPTS times. The last response (or error) is returned as-is.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+            await asyncio.sleep(retry_delay(attempt))
+            continue
+        
+        if not is_retryable(response.status_code) or last_attempt:
+            return response
+        await asyncio.sleep(retry_delay(attempt, response))
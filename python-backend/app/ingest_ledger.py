@@ -0,0 +1,143 @@
+"""
+Ingest ledger - local SQLite record of which Drive files are indexed
+- Maps (namespace, meeting_id, file_id) -> (modified_time, content_sha256)
+- Read once per sync instead of fetching each file's vector from Pinecone
+- Rows are written only after a file's vectors are upserted successfully
+- Rows are dropped wherever vectors are deleted: per file in delete_file_vectors,
+  per namespace on /delete, so a ledger hit can be trusted without Pinecone
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+import asyncio
+import logging
+import sqlite3
+import threading
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    namespace TEXT NOT NULL,
+    meeting_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    modified_time TEXT NOT NULL,
+    content_sha256 TEXT,
+    PRIMARY KEY (namespace, meeting_id, file_id)
+)
+"""
+
+_connection: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Open the ledger database once (shared by the worker threads, guarded by _lock)"""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(settings.INGEST_LEDGER_PATH, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        _connection.execute(_SCHEMA)
+        _connection.commit()
+    return _connection
+
+
+def _load(namespace: str, meeting_id: str) -> Dict[str, Tuple[str, Optional[str]]]:
+    with _lock:
+        rows = _get_connection().execute(
+            "SELECT file_id, modified_time, content_sha256 FROM files "
+            "WHERE namespace = ? AND meeting_id = ?",
+            (namespace, meeting_id)
+        ).fetchall()
+    return {file_id: (modified_time, sha256) for file_id, modified_time, sha256 in rows}
+
+
+def _record(
+    namespace: str,
+    meeting_id: str,
+    entries: Iterable[Tuple[str, str, Optional[str]]]
+) -> None:
+    with _lock:
+        conn = _get_connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO files "
+            "(namespace, meeting_id, file_id, modified_time, content_sha256) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(namespace, meeting_id, *entry) for entry in entries]
+        )
+        conn.commit()
+
+
+def _forget(namespace: str, file_ids: Iterable[str]) -> None:
+    with _lock:
+        conn = _get_connection()
+        conn.executemany(
+            "DELETE FROM files WHERE namespace = ? AND file_id = ?",
+            [(namespace, file_id) for file_id in file_ids]
+        )
+        conn.commit()
+
+
+def _forget_namespace(namespace: str) -> None:
+    with _lock:
+        conn = _get_connection()
+        conn.execute("DELETE FROM files WHERE namespace = ?", (namespace,))
+        conn.commit()
+
+
+async def load_ledger(namespace: str, meeting_id: str) -> Dict[str, Tuple[str, Optional[str]]]:
+    """file_id -> (modified_time, content_sha256) for every file indexed for a meeting"""
+    try:
+        return await asyncio.to_thread(_load, namespace, meeting_id)
+    except sqlite3.Error as e:
+        logger.warning("⚠️ Could not read ingest ledger: %s", e)
+        return {}
+
+
+async def record_files(
+    namespace: str,
+    meeting_id: str,
+    entries: Iterable[Tuple[str, str, Optional[str]]]
+) -> None:
+    """Record (file_id, modified_time, content_sha256) rows for indexed files"""
+    entries = list(entries)
+    if not entries:
+        return
+    try:
+        await asyncio.to_thread(_record, namespace, meeting_id, entries)
+    except sqlite3.Error as e:
+        # A missing row only costs a Pinecone lookup on the next sync
+        logger.warning("⚠️ Could not update ingest ledger: %s", e)
+
+
+async def forget_files(namespace: str, file_ids: Iterable[str]) -> None:
+    """Drop ledger rows (for every meeting) of files whose vectors were removed"""
+    file_ids = list(file_ids)
+    if not file_ids:
+        return
+    try:
+        await asyncio.to_thread(_forget, namespace, file_ids)
+    except sqlite3.Error as e:
+        logger.warning("⚠️ Could not update ingest ledger: %s", e)
+
+
+async def forget_namespace(namespace: str) -> None:
+    """
+    Drop every ledger row of a namespace after vectors were deleted from it by ID
+    (the next sync re-checks those files against Pinecone instead of skipping them)
+    """
+    try:
+        await asyncio.to_thread(_forget_namespace, namespace)
+    except sqlite3.Error as e:
+        logger.warning("⚠️ Could not update ingest ledger: %s", e)
+
+
+def close_ledger() -> None:
+    """Close the ledger database (called on shutdown)"""
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
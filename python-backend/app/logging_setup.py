@@ -0,0 +1,42 @@
+"""
+Logging setup - route loggers hand records to a queue
+- A QueueListener thread does the stream I/O, so handlers never block on stderr
+- Level comes from settings.LOG_LEVEL (INFO hides per-request debug chatter)
+"""
+
+from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+import logging
+import queue
+
+from app.config import settings
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging() -> None:
+    """Route root logging through a background queue listener (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread (called on shutdown)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -5,38 +5,47 @@ FastAPI server with LangChain integration
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from array import array
+import asyncio
+import logging
 import time
 import re
 
 from app.config import settings, validate_settings
+from app.http_clients import close_http_clients
+from app.ingest_ledger import close_ledger
+from app.logging_setup import setup_logging, stop_logging
 from app.routes import health, parse, search, chat, embed, scrape, serp, drive
 
 # Validate settings on startup
 validate_settings()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Create FastAPI app
 app = FastAPI(
     title="Friday Python Backend",
     description="LangChain-powered AI backend for Friday Chrome Extension",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse  # orjson: much faster than stdlib json encoding
 )
 
 # CORS Configuration
+# Localhost variations, plus any Chrome extension when enabled, checked with one regex
+_ALLOWED_ORIGIN_PREFIX_RE = re.compile(
+    r"^(?:http://(?:localhost|127\.0\.0\.1)"
+    + (r"|chrome-extension://" if settings.ALLOW_ALL_EXTENSIONS else "")
+    + ")"
+)
+_ALLOWED_ORIGINS = frozenset(settings.CORS_ORIGINS)
+
 def is_allowed_origin(origin: str) -> bool:
-    if not origin:
-        return True
-    
-    # Allow localhost variations
-    if origin.startswith("http://localhost") or origin.startswith("http://127.0.0.1"):
-        return True
-    
-    # Allow Chrome extensions
-    if settings.ALLOW_ALL_EXTENSIONS and origin.startswith("chrome-extension://"):
-        return True
-    
-    # Check allowlist
-    return origin in settings.CORS_ORIGINS
+    return (
+        not origin
+        or _ALLOWED_ORIGIN_PREFIX_RE.match(origin) is not None
+        or origin in _ALLOWED_ORIGINS
+    )
 
 # Custom CORS middleware for Chrome extension support
 @app.middleware("http")
@@ -45,7 +54,7 @@ async def cors_middleware(request: Request, call_next):
     
     # Handle preflight
     if request.method == "OPTIONS":
-        response = JSONResponse(content={})
+        response = ORJSONResponse(content={})
         response.headers["Access-Control-Allow-Origin"] = origin if is_allowed_origin(origin) else ""
         response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
         response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-API-Key"
@@ -61,29 +70,37 @@ async def cors_middleware(request: Request, call_next):
     return response
 
 # Rate limiting state
-rate_limit_store = {}
+# Fixed-size table of packed (window_start_ms << 20 | count) slots indexed by
+# the client IP hash, so memory stays constant however many clients connect.
+# IPs that collide on a slot share one bucket.
 RATE_LIMIT_WINDOW = 60  # seconds
 RATE_LIMIT_MAX = 500  # requests per window
+RATE_LIMIT_SLOTS = 1 << 16
+RATE_LIMIT_COUNT_BITS = 20
+RATE_LIMIT_COUNT_MASK = (1 << RATE_LIMIT_COUNT_BITS) - 1
+rate_limit_store = array("Q", bytes(8 * RATE_LIMIT_SLOTS))
 
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
     client_ip = request.client.host
-    current_time = time.time()
+    current_ms = int(time.time() * 1000)
+    
+    slot_index = hash(client_ip) & (RATE_LIMIT_SLOTS - 1)
+    slot = rate_limit_store[slot_index]
+    window_start = slot >> RATE_LIMIT_COUNT_BITS
+    requests = slot & RATE_LIMIT_COUNT_MASK
     
-    if client_ip in rate_limit_store:
-        requests, window_start = rate_limit_store[client_ip]
-        if current_time - window_start > RATE_LIMIT_WINDOW:
-            rate_limit_store[client_ip] = (1, current_time)
-        elif requests >= RATE_LIMIT_MAX:
-            print(f"⚠️ Rate limit exceeded for IP: {client_ip}")
-            return JSONResponse(
-                status_code=429,
-                content={"error": "Too many requests. Please wait before trying again."}
-            )
-        else:
-            rate_limit_store[client_ip] = (requests + 1, window_start)
+    # Load/decide/store happens without an await, so it is atomic on the event loop
+    if current_ms - window_start > RATE_LIMIT_WINDOW * 1000:
+        rate_limit_store[slot_index] = (current_ms << RATE_LIMIT_COUNT_BITS) | 1
+    elif requests >= RATE_LIMIT_MAX:
+        logger.warning("⚠️ Rate limit exceeded for IP: %s", client_ip)
+        return ORJSONResponse(
+            status_code=429,
+            content={"error": "Too many requests. Please wait before trying again."}
+        )
     else:
-        rate_limit_store[client_ip] = (1, current_time)
+        rate_limit_store[slot_index] = slot + 1
     
     return await call_next(request)
 
@@ -101,21 +118,40 @@ app.include_router(drive.router, tags=["Google Drive"])
 try:
     from app.routes import oauth
     app.include_router(oauth.router, tags=["OAuth"])
-    print("✅ OAuth routes enabled")
+    logger.info("✅ OAuth routes enabled")
 except ImportError as e:
-    print(f"⚠️ OAuth routes not available: {e}")
+    logger.warning("⚠️ OAuth routes not available: %s", e)
 
 # LangChain RAG Chat (with memory)
+rag_chat_enabled = False
 try:
     from app.routes import rag_chat
     app.include_router(rag_chat.router, tags=["RAG Chat"])
-    print("✅ LangChain RAG Chat enabled")
+    rag_chat_enabled = True
+    logger.info("✅ LangChain RAG Chat enabled")
 except ImportError as e:
-    print(f"⚠️ LangChain RAG Chat not available: {e}")
+    logger.warning("⚠️ LangChain RAG Chat not available: %s", e)
+
+# Background warmup task (kept referenced so it is not garbage collected)
+warmup_task = None
+
+async def warmup_rag():
+    """Warm the Advanced RAG retriever and reranker in the background"""
+    try:
+        from app.chains.advanced_rag import warmup
+        await warmup()
+        logger.info("🔥 RAG warmup complete")
+    except Exception:
+        # Surface the cause: the same failure will hit the first RAG request
+        logger.exception("⚠️ RAG warmup failed")
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
+    global warmup_task
+    if rag_chat_enabled:
+        warmup_task = asyncio.create_task(warmup_rag())
+    
     print(f"""
 🚀 Friday Python Backend v2.0 (Unified Backend)
    Running at http://localhost:{settings.PORT}
@@ -146,5 +182,16 @@ async def startup_event():
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
-    print("🛑 Gracefully shutting down server...")
+    logger.info("🛑 Gracefully shutting down server...")
+    
+    await close_http_clients()
+    drive.shutdown_chunk_pool()
+    close_ledger()
+    
+    # Close the Advanced RAG genai client (a no-op if it was never created)
+    if rag_chat_enabled:
+        from app.chains.advanced_rag import close_genai_client
+        await close_genai_client()
+    
+    stop_logging()
 
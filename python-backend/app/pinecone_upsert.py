@@ -0,0 +1,98 @@
+"""
+Pinecone upserts shared by Drive sync, /upsert and scraping
+- Vectors are serialized once and packed into size-capped request bodies
+- Batches are posted concurrently, retrying throttled/failed requests
+- Every upsert invalidates the namespace in the semantic search cache
+"""
+
+from typing import Dict, List
+import asyncio
+import logging
+
+import httpx
+import orjson
+
+from app.http_clients import get_pinecone_client, request_with_retry
+from app.search_cache import search_cache
+
+logger = logging.getLogger(__name__)
+
+# Upsert batches in flight at once
+UPSERT_CONCURRENCY = 8
+
+# Upsert request body limit, kept under Pinecone's 2 MB cap
+UPSERT_MAX_BYTES = 1_800_000
+
+
+def build_upsert_bodies(
+    vectors: List[Dict],
+    namespace: str,
+    batch_size: int = 100,
+    max_bytes: int = UPSERT_MAX_BYTES
+) -> List[bytes]:
+    """
+    Serialize vectors once and pack them into upsert request bodies holding
+    at most batch_size vectors and max_bytes bytes (Pinecone caps at 2 MB).
+    """
+    # orjson writes the float32 embedding arrays directly, no tolist() copy
+    head = b'{"vectors":['
+    tail = b'],"namespace":' + orjson.dumps(namespace) + b"}"
+    overhead = len(head) + len(tail)
+    
+    bodies = []
+    batch: List[bytes] = []
+    batch_bytes = overhead
+    for vector in vectors:
+        encoded = orjson.dumps(vector, option=orjson.OPT_SERIALIZE_NUMPY)
+        size = len(encoded) + 1  # comma separator
+        if batch and (len(batch) == batch_size or batch_bytes + size > max_bytes):
+            bodies.append(head + b",".join(batch) + tail)
+            batch = []
+            batch_bytes = overhead
+        batch.append(encoded)
+        batch_bytes += size
+    
+    if batch:
+        bodies.append(head + b",".join(batch) + tail)
+    return bodies
+
+
+async def post_upsert_batch(
+    client: httpx.AsyncClient,
+    body: bytes,
+    sem: asyncio.Semaphore
+) -> int:
+    """POST one upsert body (retries 429/5xx with backoff), returning the upserted count"""
+    async with sem:
+        response = await request_with_retry(
+            client,
+            "POST",
+            "/vectors/upsert",
+            content=body
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Pinecone upsert failed: {response.text}")
+        
+        return orjson.loads(response.content).get("upsertedCount", 0)
+
+
+async def batch_upsert(vectors: List[Dict], namespace: str, batch_size: int = 100) -> int:
+    """
+    Upsert vectors to Pinecone in size-capped batches, UPSERT_CONCURRENCY in
+    flight. Returns the total upsertedCount reported by Pinecone.
+    """
+    client = get_pinecone_client()
+    sem = asyncio.Semaphore(UPSERT_CONCURRENCY)
+    bodies = build_upsert_bodies(vectors, namespace, batch_size)
+    
+    try:
+        counts = await asyncio.gather(*[
+            post_upsert_batch(client, body, sem) for body in bodies
+        ])
+    finally:
+        # Even a partial upsert changes what /search should return
+        search_cache.invalidate(namespace)
+    
+    logger.debug("📤 Upserted %s vectors in %s batches", len(vectors), len(bodies))
+    return sum(counts)
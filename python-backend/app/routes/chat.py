@@ -4,14 +4,19 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import json
+import logging
+import orjson
+import threading
+from cachetools import TTLCache
 
 from app.config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Store conversation memories per session
-conversation_memories: Dict[str, List[Dict[str, str]]] = {}
+# Store conversation memories per session (idle sessions expire after an hour)
+conversation_memories: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+conversation_lock = threading.RLock()
 MAX_MEMORY_MESSAGES = 20
 
 class Message(BaseModel):
@@ -35,19 +40,18 @@ async def chat_stream(request: ChatRequest):
     
     # Update session memory if session_id provided
     if request.session_id:
-        if request.session_id not in conversation_memories:
-            conversation_memories[request.session_id] = []
-        
-        # Add new messages to memory (keep last N)
-        for msg in request.messages:
-            conversation_memories[request.session_id].append({
-                "role": msg.role,
-                "content": msg.content
-            })
-        
-        # Trim memory
-        if len(conversation_memories[request.session_id]) > MAX_MEMORY_MESSAGES:
-            conversation_memories[request.session_id] = conversation_memories[request.session_id][-MAX_MEMORY_MESSAGES:]
+        with conversation_lock:
+            history = conversation_memories.get(request.session_id, [])
+            
+            # Add new messages to memory (keep last N)
+            for msg in request.messages:
+                history.append({
+                    "role": msg.role,
+                    "content": msg.content
+                })
+            
+            # Trim memory (re-inserting also refreshes the session TTL)
+            conversation_memories[request.session_id] = history[-MAX_MEMORY_MESSAGES:]
     
     async def generate():
         """Generate streaming response"""
@@ -101,23 +105,23 @@ async def chat_stream(request: ChatRequest):
             for chunk in response:
                 if chunk.text:
                     # Format as SSE in Gemini-compatible format (frontend expects this)
-                    data = json.dumps({
+                    data = orjson.dumps({
                         "candidates": [{
                             "content": {
                                 "parts": [{"text": chunk.text}]
                             }
                         }]
                     })
-                    yield f"data: {data}\n\n"
+                    yield b"data: " + data + b"\n\n"
             
             # Send done signal
-            yield "data: [DONE]\n\n"
+            yield b"data: [DONE]\n\n"
             
         except Exception as e:
-            print(f"❌ Chat error: {str(e)}")
-            error_data = json.dumps({"error": str(e)})
-            yield f"data: {error_data}\n\n"
-            yield "data: [DONE]\n\n"
+            logger.error("❌ Chat error: %s", e)
+            error_data = orjson.dumps({"error": str(e)})
+            yield b"data: " + error_data + b"\n\n"
+            yield b"data: [DONE]\n\n"
     
     return StreamingResponse(
         generate(),
@@ -133,16 +137,18 @@ async def chat_stream(request: ChatRequest):
 @router.get("/memory/{session_id}")
 async def get_memory(session_id: str):
     """Get conversation memory for a session"""
+    with conversation_lock:
+        messages = conversation_memories.get(session_id, [])
     return {
         "session_id": session_id,
-        "messages": conversation_memories.get(session_id, []),
-        "count": len(conversation_memories.get(session_id, []))
+        "messages": messages,
+        "count": len(messages)
     }
 
 
 @router.delete("/memory/{session_id}")
 async def clear_memory(session_id: str):
     """Clear conversation memory for a session"""
-    if session_id in conversation_memories:
-        del conversation_memories[session_id]
+    with conversation_lock:
+        conversation_memories.pop(session_id, None)
     return {"success": True, "message": f"Memory cleared for session {session_id}"}
@@ -2,18 +2,75 @@
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+import asyncio
+import hashlib
 import httpx
 import io
+import logging
+import multiprocessing
+import orjson
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from app.config import settings
+from app.http_clients import (
+    MAX_ATTEMPTS,
+    get_drive_client,
+    get_pinecone_client,
+    is_retryable,
+    request_with_retry,
+    retry_delay,
+)
+from app.ingest_ledger import forget_files, load_ledger, record_files
+from app.pinecone_upsert import batch_upsert
+from app.search_cache import search_cache
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 DRIVE_API = "https://www.googleapis.com/drive/v3"
 
+# Sync pipeline workers per stage: downloads and upserts are I/O-bound,
+# parsing is CPU-bound, embedding batches chunks across files
+DOWNLOAD_WORKERS = 8
+PARSE_WORKERS = os.cpu_count() or 4
+EMBED_WORKERS = 2
+UPSERT_WORKERS = 4
+
+# Bound on files waiting between stages (caps downloaded bytes held in memory)
+PIPELINE_QUEUE_SIZE = 16
+
+# Cross-file embedding batches: up to 100 chunks (one API call), waiting at most 50ms
+EMBED_BATCH_TEXTS = 100
+EMBED_BATCH_WINDOW_SECONDS = 0.05
+
+# Folder listing: max page size, and folders listed at once per BFS level
+DRIVE_PAGE_SIZE = 1000
+CONCURRENT_FOLDERS = 8
+
+# Vector IDs per Pinecone fetch request
+FETCH_BATCH_SIZE = 100
+
+# Streamed download read size
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Chunking is CPU-bound; run it in worker processes, off the event loop.
+# Spawned (not forked) so workers don't inherit the server's threads.
+_CHUNK_POOL = ProcessPoolExecutor(
+    max_workers=os.cpu_count(),
+    mp_context=multiprocessing.get_context("spawn")
+)
+
+
+def shutdown_chunk_pool():
+    """Stop the chunking worker processes (called on shutdown)"""
+    _CHUNK_POOL.shutdown(wait=False, cancel_futures=True)
+
 # Supported MIME types
 SUPPORTED_MIMES = [
     "application/pdf",
@@ -54,117 +111,186 @@ class SyncResult(BaseModel):
     errors: Optional[List[Dict[str, str]]] = None
 
 
-async def list_files_recursive(
-    folder_id: str, 
-    access_token: str, 
-    accumulated: List[Dict] = None
+async def list_folder(
+    folder_id: str,
+    access_token: str,
+    client: httpx.AsyncClient
 ) -> List[Dict]:
-    """Recursively list all files in a folder and subfolders"""
-    if accumulated is None:
-        accumulated = []
+    """List every direct child of a folder, following nextPageToken"""
+    query = f"'{folder_id}' in parents and trashed = false"
+    fields = "nextPageToken,files(id,name,mimeType,modifiedTime,webViewLink)"
+    params = {"q": query, "fields": fields, "pageSize": DRIVE_PAGE_SIZE}
+    headers = {"Authorization": f"Bearer {access_token}"}
+    children = []
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        query = f"'{folder_id}' in parents and trashed = false"
-        fields = "files(id,name,mimeType,modifiedTime,webViewLink)"
-        
-        response = await client.get(
+    while True:
+        response = await request_with_retry(
+            client,
+            "GET",
             f"{DRIVE_API}/files",
-            params={"q": query, "fields": fields},
-            headers={"Authorization": f"Bearer {access_token}"}
+            params=params,
+            headers=headers
         )
         
         if response.status_code != 200:
             raise Exception(f"Drive API error: {response.status_code} - {response.text}")
         
-        data = response.json()
-        files = data.get("files", [])
+        data = orjson.loads(response.content)
+        children.extend(data.get("files", []))
         
-        for file in files:
-            if file["mimeType"] == "application/vnd.google-apps.folder":
-                # Recurse into subfolder
-                await list_files_recursive(file["id"], access_token, accumulated)
-            else:
-                accumulated.append(file)
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return children
+        params = {**params, "pageToken": page_token}
+
+
+async def list_files_recursive(
+    folder_id: str, 
+    access_token: str, 
+    client: Optional[httpx.AsyncClient] = None
+) -> List[Dict]:
+    """
+    List all files in a folder and its subfolders, breadth-first.
+    Each level of subfolders is listed concurrently.
+    """
+    if client is None:
+        client = get_drive_client()
+    sem = asyncio.Semaphore(CONCURRENT_FOLDERS)
     
-    return accumulated
-
-
-async def download_file(file_id: str, mime_type: str, access_token: str) -> bytes:
-    """Download file content from Drive, handling Google Workspace exports"""
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        # Google Workspace files need to be exported
-        if mime_type in EXPORT_MIMES:
-            export_mime = EXPORT_MIMES[mime_type]
-            url = f"{DRIVE_API}/files/{file_id}/export"
-            params = {"mimeType": export_mime}
-        else:
-            url = f"{DRIVE_API}/files/{file_id}"
-            params = {"alt": "media"}
-        
-        response = await client.get(
-            url,
-            params=params,
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Download failed: {response.status_code}")
-        
-        return response.content
+    async def list_bounded(fid: str) -> List[Dict]:
+        async with sem:
+            return await list_folder(fid, access_token, client)
+    
+    files = []
+    level = [folder_id]
+    while level:
+        listings = await asyncio.gather(*[list_bounded(fid) for fid in level])
+        level = []
+        for children in listings:
+            for file in children:
+                if file["mimeType"] == "application/vnd.google-apps.folder":
+                    level.append(file["id"])
+                else:
+                    files.append(file)
+    
+    return files
 
 
-async def get_indexed_modified_time(file_id: str, meeting_id: str, namespace: str) -> Optional[str]:
-    """Check Pinecone if file is already indexed using fetch API (more reliable than query)"""
-    try:
-        # Use fetch by ID instead of query with zero vector
-        # This is more reliable because query with [0.0]*768 often returns no matches
-        vector_id = f"{meeting_id}_{file_id}_0"  # First chunk ID pattern
-        
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{settings.PINECONE_INDEX_HOST}/vectors/fetch",
-                params={"ids": vector_id, "namespace": namespace},
-                headers={
-                    "Api-Key": settings.PINECONE_API_KEY,
-                }
+async def download_file(file_id: str, mime_type: str, access_token: str) -> bytearray:
+    """
+    Download file content from Drive, handling Google Workspace exports.
+    Streams into a single bytearray so the body is never held twice;
+    throttled (429) and 5xx responses are retried with backoff.
+    """
+    # Google Workspace files need to be exported
+    if mime_type in EXPORT_MIMES:
+        export_mime = EXPORT_MIMES[mime_type]
+        url = f"{DRIVE_API}/files/{file_id}/export"
+        params = {"mimeType": export_mime}
+    else:
+        url = f"{DRIVE_API}/files/{file_id}"
+        params = {"alt": "media"}
+    headers = {"Authorization": f"Bearer {access_token}"}
+    
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        try:
+            async with get_drive_client().stream(
+                "GET",
+                url,
+                params=params,
+                headers=headers,
+                timeout=60.0
+            ) as response:
+                if is_retryable(response.status_code) and not last_attempt:
+                    delay = retry_delay(attempt, response)
+                elif response.status_code != 200:
+                    raise Exception(f"Download failed: {response.status_code}")
+                else:
+                    content = bytearray()
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        content.extend(chunk)
+                    break
+        except httpx.TransportError:
+            # Resets and timeouts (also mid-body) restart the download, as request_with_retry does
+            if last_attempt:
+                raise
+            delay = retry_delay(attempt)
+        await asyncio.sleep(delay)
+    
+    return content
+
+
+async def get_indexed_modified_times(
+    file_ids: List[str],
+    meeting_id: str,
+    namespace: str
+) -> Dict[str, str]:
+    """
+    Look up the indexed modified_time of many files at once.
+    Fetches each file's first-chunk vector by ID (more reliable than query),
+    FETCH_BATCH_SIZE IDs per request, with all requests in flight together.
+    """
+    client = get_pinecone_client()
+    # First chunk ID pattern (build_file_vectors numbers kept chunks from 0)
+    vector_ids = {f"{meeting_id}_{file_id}_0": file_id for file_id in file_ids}
+    ids = list(vector_ids)
+    
+    async def fetch_batch(batch: List[str]) -> Dict[str, Any]:
+        try:
+            response = await request_with_retry(
+                client,
+                "GET",
+                "/vectors/fetch",
+                params=[("ids", vector_id) for vector_id in batch] + [("namespace", namespace)],
+                timeout=10.0
             )
-            
             if response.status_code == 200:
-                data = response.json()
-                vectors = data.get("vectors", {})
-                if vector_id in vectors:
-                    modified_time = vectors[vector_id].get("metadata", {}).get("modified_time")
-                    print(f"📋 Found indexed: {file_id} (modified: {modified_time})")
-                    return modified_time
-                else:
-                    print(f"🆕 Not yet indexed: {file_id}")
-    except Exception as e:
-        print(f"⚠️ Could not check indexed time for {file_id}: {e}")
+                return orjson.loads(response.content).get("vectors", {})
+            logger.warning("⚠️ Could not check indexed times: %s", response.status_code)
+        except Exception as e:
+            logger.warning("⚠️ Could not check indexed times: %s", e)
+        return {}
     
-    return None
+    results = await asyncio.gather(*[
+        fetch_batch(ids[i:i + FETCH_BATCH_SIZE])
+        for i in range(0, len(ids), FETCH_BATCH_SIZE)
+    ])
+    
+    indexed_times = {}
+    for vectors in results:
+        for vector_id, vector in vectors.items():
+            modified_time = vector.get("metadata", {}).get("modified_time")
+            if vector_id in vector_ids and modified_time:
+                indexed_times[vector_ids[vector_id]] = modified_time
+    
+    logger.debug("📋 Found %s/%s files already indexed", len(indexed_times), len(file_ids))
+    return indexed_times
 
 
 async def delete_file_vectors(file_id: str, namespace: str):
-    """Delete all vectors for a file from Pinecone"""
+    """Delete all vectors for a file from Pinecone (and its ingest ledger rows)"""
+    # Forget first: if the delete lands but the re-upsert fails, the next
+    # sync must not skip the file as unchanged
+    await forget_files(namespace, [file_id])
+    search_cache.invalidate(namespace)
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            # Delete by filter (file_id)
-            response = await client.post(
-                f"{settings.PINECONE_INDEX_HOST}/vectors/delete",
-                headers={
-                    "Api-Key": settings.PINECONE_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "namespace": namespace,
-                    "filter": {"file_id": {"$eq": file_id}}
-                }
-            )
-            
-            if response.status_code == 200:
-                print(f"🗑️ Deleted old vectors for file_id: {file_id}")
+        # Delete by filter (file_id)
+        response = await request_with_retry(
+            get_pinecone_client(),
+            "POST",
+            "/vectors/delete",
+            content=orjson.dumps({
+                "namespace": namespace,
+                "filter": {"file_id": {"$eq": file_id}}
+            }),
+            timeout=20.0
+        )
+        
+        if response.status_code == 200:
+            logger.debug("🗑️ Deleted old vectors for file_id: %s", file_id)
     except Exception as e:
-        print(f"⚠️ Could not delete vectors for {file_id}: {e}")
+        logger.warning("⚠️ Could not delete vectors for %s: %s", file_id, e)
 
 
 def is_supported(mime_type: str, filename: str = "") -> bool:
@@ -177,64 +303,127 @@ def is_supported(mime_type: str, filename: str = "") -> bool:
     return False
 
 
+def build_file_vectors(
+    meeting_id: str,
+    file: Dict,
+    chunks: List[Dict],
+    embeddings: List[Optional[Any]]
+) -> List[Dict]:
+    """
+    Pinecone vectors for one file's chunks (chunks too short to embed are dropped).
+    Kept chunks are numbered without gaps, so any indexed file has the `_0`
+    vector that get_indexed_modified_times probes for.
+    """
+    file_id = file["id"]
+    file_name = file["name"]
+    mime_type = file["mimeType"]
+    source_url = file.get("webViewLink", f"https://drive.google.com/file/d/{file_id}")
+    
+    embedded = [
+        (chunk_data, embedding)
+        for chunk_data, embedding in zip(chunks, embeddings)
+        if embedding is not None
+    ]
+    
+    vectors = []
+    for i, (chunk_data, embedding) in enumerate(embedded):
+        chunk_text_content = chunk_data["text"]
+        chunk_meta = chunk_data.get("metadata", {})
+        
+        vectors.append({
+            "id": f"{meeting_id}_{file_id}_{i}",
+            "values": embedding,  # float32 array, serialized by orjson
+            "metadata": {
+                "file_id": file_id,
+                "filename": file_name,  # For backward compatibility
+                "title": file_name,
+                "source": source_url,
+                "file_type": mime_type.split("/")[-1].split(".")[-1],
+                "modified_time": file.get("modifiedTime", ""),
+                "chunkIndex": i,
+                "content": chunk_text_content[:1000],
+                **chunk_meta  # page_number, row_index, etc.
+            }
+        })
+    return vectors
+
+
 @router.post("/drive/sync", response_model=SyncResult)
 async def sync_drive_folder(request: SyncRequest):
     """
     Sync a Google Drive folder:
     1. Recursively list all files
-    2. Check if each file needs re-indexing (incremental)
+    2. Check if each file needs re-indexing (incremental, via the ingest ledger)
     3. Download, parse, chunk, embed, and upsert
+    
+    Step 3 is a pipeline of worker stages joined by queues, so one file's
+    download overlaps another's parsing, embedding and upsert:
+    download -> parse + chunk -> embed (batched across files) -> upsert
     """
     from app.routes.parse import parse_content
-    from app.routes.embed import get_embedding_internal
+    from app.routes.embed import get_embeddings_batch
     
-    print(f"📁 Starting sync for folder {request.folderId}, meeting {request.meetingId}")
+    logger.info("📁 Starting sync for folder %s, meeting %s", request.folderId, request.meetingId)
     
     namespace = request.namespace or f"meeting:{request.meetingId}"
-    synced = 0
-    skipped = 0
-    errors = []
+    loop = asyncio.get_running_loop()
     
-    try:
-        # Step 1: Recursively list all files
-        all_files = await list_files_recursive(request.folderId, request.accessToken)
-        print(f"📄 Found {len(all_files)} files (recursive)")
-        
-        for file in all_files:
+    # Queue items carry the file's index in all_files, which keys its result
+    download_q: asyncio.Queue = asyncio.Queue()
+    parse_q: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    embed_q: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    upsert_q: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    
+    # index -> ("synced" | "skipped", error or None); files never reaching upsert stay skipped
+    results: Dict[int, Tuple[str, Optional[Dict[str, str]]]] = {}
+    
+    def fail(index: int, error: Exception) -> None:
+        file_name = all_files[index]["name"]
+        logger.error("❌ Error processing %s: %s", file_name, error)
+        results[index] = ("skipped", {"file": file_name, "error": str(error)})
+    
+    async def download_worker():
+        """Incremental check, then download; unchanged files stop here"""
+        while True:
+            index = await download_q.get()
+            file = all_files[index]
             file_id = file["id"]
             file_name = file["name"]
-            mime_type = file["mimeType"]
             modified_time = file.get("modifiedTime", "")
-            source_url = file.get("webViewLink", f"https://drive.google.com/file/d/{file_id}")
-            
-            # Check if supported
-            if not is_supported(mime_type, file_name):
-                print(f"⏭️ Skipping unsupported: {file_name} ({mime_type})")
-                skipped += 1
-                continue
-            
             try:
-                # Step 2: Incremental check
-                indexed_time = await get_indexed_modified_time(file_id, request.meetingId, namespace)
+                indexed_time, indexed_sha256 = indexed.get(file_id, (None, None))
                 if indexed_time and indexed_time == modified_time:
-                    print(f"✅ Already indexed: {file_name}")
-                    skipped += 1
+                    logger.debug("✅ Already indexed: %s", file_name)
                     continue
                 
-                # If modified, delete old vectors first
-                if indexed_time:
-                    await delete_file_vectors(file_id, namespace)
-                
-                # Step 3: Download file
-                print(f"⬇️ Downloading: {file_name}")
-                content = await download_file(file_id, mime_type, request.accessToken)
+                logger.debug("⬇️ Downloading: %s", file_name)
+                content = await download_file(file_id, file["mimeType"], request.accessToken)
                 
                 if not content or len(content) < 50:
-                    print(f"⚠️ File too small: {file_name}")
-                    skipped += 1
+                    logger.warning("⚠️ File too small: %s", file_name)
+                    continue
+                
+                # Touched but unchanged (e.g. renamed or re-shared): just move the checkpoint
+                content_sha256 = hashlib.sha256(content).hexdigest()
+                if indexed_sha256 == content_sha256:
+                    await record_files(namespace, request.meetingId, [(file_id, modified_time, content_sha256)])
+                    logger.debug("✅ Content unchanged: %s", file_name)
                     continue
                 
-                # Step 4: Parse content
+                await parse_q.put((index, content, content_sha256))
+            except Exception as e:
+                fail(index, e)
+            finally:
+                download_q.task_done()
+    
+    async def parse_worker():
+        """Extract text, then chunk it in the worker process pool"""
+        while True:
+            index, content, content_sha256 = await parse_q.get()
+            file = all_files[index]
+            file_name = file["name"]
+            mime_type = file["mimeType"]
+            try:
                 # Determine effective MIME after export
                 effective_mime = EXPORT_MIMES.get(mime_type, mime_type)
                 
@@ -243,61 +432,151 @@ async def sync_drive_folder(request: SyncRequest):
                     effective_mime, 
                     file_name
                 )
+                del content
                 
                 if not text or len(text.strip()) < 50:
-                    print(f"⚠️ No extractable text: {file_name}")
-                    skipped += 1
+                    logger.warning("⚠️ No extractable text: %s", file_name)
                     continue
                 
-                # Step 5: Chunk text
-                chunks = chunk_text_smart(text, mime_type, 1000, 200)
-                print(f"📦 Created {len(chunks)} chunks for {file_name}")
+                chunks = await loop.run_in_executor(
+                    _CHUNK_POOL, chunk_text_smart, text, mime_type, 1000, 200
+                )
+                logger.debug("📦 Created %s chunks for %s", len(chunks), file_name)
                 
-                # Step 6: Generate embeddings and prepare vectors
-                vectors = []
-                for i, chunk_data in enumerate(chunks):
-                    chunk_text_content = chunk_data["text"]
-                    chunk_meta = chunk_data.get("metadata", {})
-                    
-                    # Prepend filename and file type for better searchability
-                    # This enables queries like "pptx file এ কি আছে?" or "cpp.txt এ কি লেখা?"
-                    file_extension = file_name.split('.')[-1].lower() if '.' in file_name else ''
-                    text_for_embedding = f"[File: {file_name}] [Type: {file_extension}] {chunk_text_content}"
-                    
-                    embedding = await get_embedding_internal(text_for_embedding)
-                    if not embedding:
-                        continue
-                    
-                    vectors.append({
-                        "id": f"{request.meetingId}_{file_id}_{i}",
-                        "values": embedding,
-                        "metadata": {
-                            "file_id": file_id,
-                            "filename": file_name,  # For backward compatibility
-                            "title": file_name,
-                            "source": source_url,
-                            "file_type": mime_type.split("/")[-1].split(".")[-1],
-                            "modified_time": modified_time,
-                            "chunkIndex": i,
-                            "content": chunk_text_content[:1000],
-                            **chunk_meta  # page_number, row_index, etc.
-                        }
-                    })
+                if chunks:
+                    await embed_q.put((index, chunks, content_sha256))
+            except Exception as e:
+                fail(index, e)
+            finally:
+                parse_q.task_done()
+    
+    async def embed_worker():
+        """
+        Gather chunks from several files (up to EMBED_BATCH_TEXTS, waiting at
+        most EMBED_BATCH_WINDOW_SECONDS) and embed them together.
+        Only the chunk text is embedded; filename/type live in metadata, and
+        queries naming a file ("cpp.txt এ কি লেখা?") are filtered on it at query time
+        """
+        while True:
+            batch = [await embed_q.get()]
+            texts = len(batch[0][1])
+            deadline = loop.time() + EMBED_BATCH_WINDOW_SECONDS
+            
+            while texts < EMBED_BATCH_TEXTS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(embed_q.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                texts += len(item[1])
+            
+            try:
+                embeddings = await get_embeddings_batch([
+                    chunk_data["text"] for _, chunks, _ in batch for chunk_data in chunks
+                ])
                 
-                # Step 7: Batch upsert
-                if vectors:
-                    await batch_upsert(vectors, namespace)
-                    synced += 1
-                    print(f"✅ Indexed: {file_name} ({len(vectors)} vectors)")
-                else:
-                    skipped += 1
-                    
-            except Exception as file_error:
-                print(f"❌ Error processing {file_name}: {str(file_error)}")
-                errors.append({"file": file_name, "error": str(file_error)})
+                offset = 0
+                for index, chunks, content_sha256 in batch:
+                    file_embeddings = embeddings[offset:offset + len(chunks)]
+                    offset += len(chunks)
+                    vectors = build_file_vectors(request.meetingId, all_files[index], chunks, file_embeddings)
+                    if vectors:
+                        await upsert_q.put((index, vectors, content_sha256))
+                    else:
+                        logger.warning("⚠️ No embeddable chunks: %s", all_files[index]["name"])
+            except Exception as e:
+                # get_embeddings_batch raises before any file is queued, so a
+                # failed batch fails every file in it (none is partially upserted)
+                for index, _, _ in batch:
+                    fail(index, e)
+            finally:
+                for _ in batch:
+                    embed_q.task_done()
+    
+    async def upsert_worker():
+        """Replace the file's old vectors and checkpoint it in the ledger"""
+        while True:
+            index, vectors, content_sha256 = await upsert_q.get()
+            file = all_files[index]
+            file_id = file["id"]
+            try:
+                # If modified, delete old vectors first
+                if indexed.get(file_id, (None, None))[0]:
+                    await delete_file_vectors(file_id, namespace)
+                
+                await batch_upsert(vectors, namespace)
+                await record_files(
+                    namespace,
+                    request.meetingId,
+                    [(file_id, file.get("modifiedTime", ""), content_sha256)]
+                )
+                logger.info("✅ Indexed: %s (%s vectors)", file['name'], len(vectors))
+                results[index] = ("synced", None)
+            except Exception as e:
+                fail(index, e)
+            finally:
+                upsert_q.task_done()
+    
+    workers: List[asyncio.Task] = []
+    try:
+        # Step 1: Recursively list all files
+        all_files = await list_files_recursive(request.folderId, request.accessToken)
+        logger.info("📄 Found %s files (recursive)", len(all_files))
+        
+        # Check which files are already indexed: the local ledger first, then
+        # batched Pinecone fetches only for files the ledger has no row for.
+        # Every path that deletes vectors also drops their ledger rows
+        # (delete_file_vectors, /delete), so a ledger hit needs no Pinecone check
+        indexed = await load_ledger(namespace, request.meetingId)
+        missing = [
+            file["id"] for file in all_files
+            if file["id"] not in indexed and is_supported(file["mimeType"], file["name"])
+        ]
+        if missing:
+            repaired = await get_indexed_modified_times(missing, request.meetingId, namespace)
+            # Backfill the ledger (no content hash until the file is re-read)
+            # so the next sync skips these lookups
+            await record_files(
+                namespace,
+                request.meetingId,
+                [(file_id, modified_time, None) for file_id, modified_time in repaired.items()]
+            )
+            indexed.update((file_id, (modified_time, None)) for file_id, modified_time in repaired.items())
+        
+        for index, file in enumerate(all_files):
+            if is_supported(file["mimeType"], file["name"]):
+                download_q.put_nowait(index)
+            else:
+                logger.debug("⏭️ Skipping unsupported: %s (%s)", file['name'], file['mimeType'])
+        
+        # Start every stage, then wait for each queue to drain in pipeline order
+        for worker, count in (
+            (download_worker, DOWNLOAD_WORKERS),
+            (parse_worker, PARSE_WORKERS),
+            (embed_worker, EMBED_WORKERS),
+            (upsert_worker, UPSERT_WORKERS),
+        ):
+            workers.extend(asyncio.create_task(worker()) for _ in range(count))
+        
+        for queue in (download_q, parse_q, embed_q, upsert_q):
+            await queue.join()
+        
+        synced = 0
+        skipped = 0
+        errors = []
+        for index in range(len(all_files)):
+            status, error = results.get(index, ("skipped", None))
+            if status == "synced":
+                synced += 1
+            else:
                 skipped += 1
+            if error:
+                errors.append(error)
         
-        print(f"✅ Sync complete: {synced} synced, {skipped} skipped")
+        logger.info("✅ Sync complete: %s synced, %s skipped", synced, skipped)
         
         return SyncResult(
             success=True,
@@ -308,8 +587,26 @@ async def sync_drive_folder(request: SyncRequest):
         )
         
     except Exception as e:
-        print(f"❌ Sync error: {str(e)}")
+        logger.error("❌ Sync error: %s", e)
         raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+# Page markers written by parse_pdf_with_pages / the Vision OCR fallback
+PAGE_MARKER_RE = re.compile(r"\[PAGE (\d+)\]")
+
+
+@lru_cache(maxsize=8)
+def get_text_splitter(chunk_size: int = 1000, overlap: int = 200) -> RecursiveCharacterTextSplitter:
+    """Shared recursive character splitter per (chunk_size, overlap)"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
 
 
 def chunk_text_smart(text: str, mime_type: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict]:
@@ -318,6 +615,7 @@ def chunk_text_smart(text: str, mime_type: str, chunk_size: int = 1000, overlap:
     Returns list of {"text": str, "metadata": dict}
     """
     chunks = []
+    splitter = get_text_splitter(chunk_size, overlap)
     
     # For Excel/CSV rows, each line is already a logical chunk
     if "spreadsheet" in mime_type or "csv" in mime_type:
@@ -332,11 +630,14 @@ def chunk_text_smart(text: str, mime_type: str, chunk_size: int = 1000, overlap:
     
     # For PDFs, try to preserve page boundaries if present
     if "pdf" in mime_type and "[PAGE " in text:
-        pages = re.split(r'\[PAGE \d+\]', text)
-        for page_num, page_text in enumerate(pages, 1):
+        # split() with a capture group yields [before, num, text, num, text, ...];
+        # use the marker's own number since parse_content skips empty pages
+        parts = PAGE_MARKER_RE.split(text)
+        pages = [(1, parts[0]), *zip(map(int, parts[1::2]), parts[2::2])]
+        for page_num, page_text in pages:
             if page_text.strip():
                 # Further chunk if page is too long
-                page_chunks = recursive_chunk(page_text.strip(), chunk_size, overlap)
+                page_chunks = splitter.split_text(page_text.strip())
                 for chunk in page_chunks:
                     chunks.append({
                         "text": chunk,
@@ -345,83 +646,8 @@ def chunk_text_smart(text: str, mime_type: str, chunk_size: int = 1000, overlap:
         return chunks
     
     # Default: Recursive character splitting
-    text_chunks = recursive_chunk(text, chunk_size, overlap)
+    text_chunks = splitter.split_text(text)
     for chunk in text_chunks:
         chunks.append({"text": chunk, "metadata": {}})
     
     return chunks
-
-
-def recursive_chunk(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-    """Recursive character text splitter"""
-    separators = ["\n\n", "\n", ". ", " ", ""]
-    
-    def split_with_separator(text: str, sep: str) -> List[str]:
-        if sep:
-            return text.split(sep)
-        return list(text)
-    
-    final_chunks = []
-    
-    for sep in separators:
-        parts = split_with_separator(text, sep)
-        
-        current_chunk = ""
-        for part in parts:
-            test_chunk = current_chunk + (sep if current_chunk else "") + part
-            
-            if len(test_chunk) <= chunk_size:
-                current_chunk = test_chunk
-            else:
-                if current_chunk:
-                    final_chunks.append(current_chunk)
-                    # Overlap: keep last portion
-                    current_chunk = current_chunk[-overlap:] + sep + part if len(current_chunk) > overlap else part
-                else:
-                    # Part itself is too long, move to next separator
-                    if sep != separators[-1]:
-                        break
-                    final_chunks.append(part[:chunk_size])
-                    current_chunk = part[chunk_size - overlap:]
-        
-        if current_chunk:
-            final_chunks.append(current_chunk)
-        
-        if final_chunks and all(len(c) <= chunk_size for c in final_chunks):
-            break
-        
-        final_chunks = []
-    
-    # Fallback: simple split
-    if not final_chunks:
-        i = 0
-        while i < len(text):
-            end = min(i + chunk_size, len(text))
-            final_chunks.append(text[i:end])
-            i = end - overlap if end < len(text) else end
-    
-    return final_chunks
-
-
-async def batch_upsert(vectors: List[Dict], namespace: str, batch_size: int = 100):
-    """Upsert vectors to Pinecone in batches"""
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            
-            response = await client.post(
-                f"{settings.PINECONE_INDEX_HOST}/vectors/upsert",
-                headers={
-                    "Api-Key": settings.PINECONE_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "vectors": batch,
-                    "namespace": namespace
-                }
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Pinecone upsert failed: {response.text}")
-            
-            print(f"📤 Upserted batch {i//batch_size + 1}: {len(batch)} vectors")
@@ -3,12 +3,16 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
-import hashlib
+import logging
+import numpy as np
+import xxhash
+from cachetools import LRUCache
 
 from google import genai
 from app.config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Initialize genai client
 _client = None
@@ -20,9 +24,21 @@ def get_genai_client():
         _client = genai.Client(api_key=settings.GOOGLE_API_KEY)
     return _client
 
-# Simple embedding cache
-embedding_cache = {}
-MAX_CACHE_SIZE = 1000
+# Embedding cache: LRU of read-only float32 arrays, bounded by their bytes
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+embedding_cache: LRUCache = LRUCache(maxsize=MAX_CACHE_BYTES, getsizeof=lambda emb: emb.nbytes)
+
+
+def to_embedding_array(values: List[float]) -> np.ndarray:
+    """Compact float32 copy of an API embedding (3 KB for 768 dims vs ~25 KB as a list)"""
+    embedding = np.asarray(values, dtype=np.float32)
+    embedding.flags.writeable = False
+    return embedding
+
+def is_embeddable(text: str) -> bool:
+    """At least 10 characters and not all whitespace (no stripped copy is made)"""
+    return bool(text) and len(text) >= 10 and not text.isspace()
+
 
 class EmbedRequest(BaseModel):
     text: str
@@ -31,25 +47,26 @@ class EmbedResponse(BaseModel):
     embedding: List[float]
     cached: bool = False
 
-def get_cache_key(text: str) -> str:
-    """Generate cache key for text"""
-    return hashlib.md5(text.encode()).hexdigest()
+def get_cache_key(text: str) -> int:
+    """Generate cache key for text (non-cryptographic 64-bit hash)"""
+    return xxhash.xxh3_64_intdigest(text.encode())
 
 
-async def get_embedding_internal(text: str) -> Optional[List[float]]:
+async def get_embedding_internal(text: str) -> Optional[np.ndarray]:
     """
     Internal function to get embedding for text.
     Used by drive.py and other internal modules.
     """
-    if not text or len(text.strip()) < 10:
+    if not is_embeddable(text):
         return None
     
     trimmed = text[:8000]
     cache_key = get_cache_key(trimmed)
     
     # Check cache
-    if cache_key in embedding_cache:
-        return embedding_cache[cache_key]
+    cached = embedding_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
     try:
         client = get_genai_client()
@@ -59,48 +76,103 @@ async def get_embedding_internal(text: str) -> Optional[List[float]]:
             config={"output_dimensionality": 768}
         )
         
-        embedding = list(result.embeddings[0].values)
+        embedding = to_embedding_array(result.embeddings[0].values)
         
-        # Cache
-        if len(embedding_cache) < MAX_CACHE_SIZE:
-            embedding_cache[cache_key] = embedding
+        # Cache (evicts least recently used entries when full)
+        embedding_cache[cache_key] = embedding
         
         return embedding
         
     except Exception as e:
-        print(f"❌ Embedding error: {str(e)}")
+        logger.error("❌ Embedding error: %s", e)
         return None
 
 
+async def get_embeddings_batch(
+    texts: List[str],
+    batch_size: int = 100
+) -> List[Optional[np.ndarray]]:
+    """
+    Embed many texts with one API call per batch of batch_size.
+    Cached texts are served from the cache; only misses are sent.
+    Returns None only for texts too short to embed; an API failure raises,
+    so callers never index a document with silently missing chunks.
+    """
+    embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+    misses: dict = {}  # cache key -> (trimmed text, [indices])
+    
+    for i, text in enumerate(texts):
+        if not is_embeddable(text):
+            continue
+        trimmed = text[:8000]
+        cache_key = get_cache_key(trimmed)
+        cached = embedding_cache.get(cache_key)
+        if cached is not None:
+            embeddings[i] = cached
+        else:
+            misses.setdefault(cache_key, (trimmed, []))[1].append(i)
+    
+    keys = list(misses)
+    client = get_genai_client()
+    
+    for start in range(0, len(keys), batch_size):
+        batch_keys = keys[start:start + batch_size]
+        try:
+            result = await client.aio.models.embed_content(
+                model="gemini-embedding-001",
+                contents=[misses[key][0] for key in batch_keys],
+                config={"output_dimensionality": 768}
+            )
+        except Exception as e:
+            logger.error("❌ Batch embedding error: %s", e)
+            raise
+        
+        if len(result.embeddings) != len(batch_keys):
+            raise Exception(
+                f"Embedding API returned {len(result.embeddings)} embeddings for {len(batch_keys)} texts"
+            )
+        
+        for key, item in zip(batch_keys, result.embeddings):
+            embedding = to_embedding_array(item.values)
+            for i in misses[key][1]:
+                embeddings[i] = embedding
+            
+            # Cache
+            embedding_cache[key] = embedding
+    
+    return embeddings
+
+
 @router.post("/ai/embed", response_model=EmbedResponse)
 async def get_embedding(request: EmbedRequest):
     """Generate embedding for text using Google GenAI"""
     
-    if not request.text or len(request.text.strip()) < 10:
+    if not is_embeddable(request.text):
         raise HTTPException(status_code=400, detail="Text too short for embedding")
     
     # Check cache first
-    cache_key = get_cache_key(request.text[:8000])
-    if cache_key in embedding_cache:
-        return EmbedResponse(embedding=embedding_cache[cache_key], cached=True)
+    trimmed = request.text[:8000]
+    cache_key = get_cache_key(trimmed)
+    cached = embedding_cache.get(cache_key)
+    if cached is not None:
+        return EmbedResponse(embedding=cached.tolist(), cached=True)
     
     try:
         client = get_genai_client()
         
         result = client.models.embed_content(
             model="gemini-embedding-001",
-            contents=request.text[:8000],
+            contents=trimmed,
             config={"output_dimensionality": 768}
         )
         
-        embedding = list(result.embeddings[0].values)
+        embedding = to_embedding_array(result.embeddings[0].values)
         
         # Cache the result
-        if len(embedding_cache) < MAX_CACHE_SIZE:
-            embedding_cache[cache_key] = embedding
+        embedding_cache[cache_key] = embedding
         
-        return EmbedResponse(embedding=embedding, cached=False)
+        return EmbedResponse(embedding=embedding.tolist(), cached=False)
         
     except Exception as e:
-        print(f"❌ Embedding error: {str(e)}")
+        logger.error("❌ Embedding error: %s", e)
         raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
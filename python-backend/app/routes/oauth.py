@@ -3,28 +3,28 @@ OAuth Routes - Authorization Code Flow with PKCE
 Exchanges authorization codes for access tokens securely
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
+from cachetools import TTLCache
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel
 import httpx
+import logging
+import orjson
 
 from app.config import settings
+from app.http_clients import get_oauth_client
 
 router = APIRouter(prefix="/oauth", tags=["OAuth"])
+logger = logging.getLogger(__name__)
 
 # ============================================
 # Temporary Store for OAuth State
+# States expire after 10 minutes (evicted lazily by the TTL cache)
 # In production, use Redis with TTL
 # ============================================
-oauth_pending_store: dict[str, dict] = {}
-
-def cleanup_expired_states():
-    """Remove states older than 10 minutes"""
-    cutoff = datetime.now() - timedelta(minutes=10)
-    expired = [k for k, v in oauth_pending_store.items() if v.get("created_at", datetime.now()) < cutoff]
-    for k in expired:
-        oauth_pending_store.pop(k, None)
+OAUTH_STATE_TTL_SECONDS = 600
+oauth_pending_store: TTLCache = TTLCache(maxsize=10_000, ttl=OAUTH_STATE_TTL_SECONDS)
 
 
 # ============================================
@@ -63,9 +63,6 @@ async def oauth_init(request: OAuthInitRequest):
     Store OAuth state and code_verifier before redirecting to Google.
     Called by frontend before initiating the OAuth flow.
     """
-    # Cleanup old states
-    cleanup_expired_states()
-    
     # Store the state and verifier
     oauth_pending_store[request.state] = {
         "code_verifier": request.code_verifier,
@@ -73,7 +70,7 @@ async def oauth_init(request: OAuthInitRequest):
         "created_at": datetime.now()
     }
     
-    print(f"✅ OAuth init: stored state {request.state[:8]}...")
+    logger.info("✅ OAuth init: stored state %s...", request.state[:8])
     return {"status": "ok"}
 
 
@@ -90,14 +87,14 @@ async def oauth_callback(
     pending = oauth_pending_store.pop(state, None)
     
     if not pending:
-        print(f"❌ OAuth callback: invalid or expired state {state[:8]}...")
+        logger.error("❌ OAuth callback: invalid or expired state %s...", state[:8])
         error_url = f"{settings.FRONTEND_URL}/dashboard.html?error=invalid_state"
         return RedirectResponse(url=error_url)
     
     code_verifier = pending["code_verifier"]
     frontend_redirect = pending["frontend_redirect"]
     
-    print(f"✅ OAuth callback: valid state, exchanging code...")
+    logger.info("✅ OAuth callback: valid state, exchanging code...")
     
     # 2. Exchange code for token
     if not settings.GOOGLE_CLIENT_ID or not settings.GOOGLE_CLIENT_SECRET:
@@ -116,29 +113,28 @@ async def oauth_callback(
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=token_data)
-            
-            if response.status_code != 200:
-                error_data = response.json()
-                print(f"❌ Token exchange failed: {error_data}")
-                error_url = f"{frontend_redirect}?error=token_exchange_failed"
-                return RedirectResponse(url=error_url)
-            
-            token_response = response.json()
-            access_token = token_response["access_token"]
-            expires_in = token_response.get("expires_in", 3600)
-            
-            print(f"✅ Token exchange successful, redirecting to frontend...")
-            
-            # 3. Redirect to frontend with token
-            # Note: For better security, consider using a short-lived code
-            # that frontend exchanges for token, rather than putting token in URL
-            redirect_url = f"{frontend_redirect}?access_token={access_token}&expires_in={expires_in}"
-            return RedirectResponse(url=redirect_url)
-            
+        response = await get_oauth_client().post(token_url, data=token_data)
+        
+        if response.status_code != 200:
+            error_data = orjson.loads(response.content)
+            logger.error("❌ Token exchange failed: %s", error_data)
+            error_url = f"{frontend_redirect}?error=token_exchange_failed"
+            return RedirectResponse(url=error_url)
+        
+        token_response = orjson.loads(response.content)
+        access_token = token_response["access_token"]
+        expires_in = token_response.get("expires_in", 3600)
+        
+        logger.info("✅ Token exchange successful, redirecting to frontend...")
+        
+        # 3. Redirect to frontend with token
+        # Note: For better security, consider using a short-lived code
+        # that frontend exchanges for token, rather than putting token in URL
+        redirect_url = f"{frontend_redirect}?access_token={access_token}&expires_in={expires_in}"
+        return RedirectResponse(url=redirect_url)
+        
     except httpx.RequestError as e:
-        print(f"❌ Network error during token exchange: {e}")
+        logger.error("❌ Network error during token exchange: %s", e)
         error_url = f"{frontend_redirect}?error=network_error"
         return RedirectResponse(url=error_url)
 
@@ -175,30 +171,29 @@ async def exchange_code_for_token(request: TokenExchangeRequest):
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=token_data)
-            
-            if response.status_code != 200:
-                error_data = response.json()
-                print(f"❌ Token exchange failed: {error_data}")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Token exchange failed: {error_data.get('error_description', error_data.get('error', 'Unknown error'))}"
-                )
-            
-            token_response = response.json()
-            
-            print(f"✅ Token exchange successful, scope: {token_response.get('scope', 'N/A')}")
-            
-            return TokenResponse(
-                access_token=token_response["access_token"],
-                token_type=token_response.get("token_type", "Bearer"),
-                expires_in=token_response.get("expires_in", 3600),
-                scope=token_response.get("scope", "")
+        response = await get_oauth_client().post(token_url, data=token_data)
+        
+        if response.status_code != 200:
+            error_data = orjson.loads(response.content)
+            logger.error("❌ Token exchange failed: %s", error_data)
+            raise HTTPException(
+                status_code=400,
+                detail=f"Token exchange failed: {error_data.get('error_description', error_data.get('error', 'Unknown error'))}"
             )
-            
+        
+        token_response = orjson.loads(response.content)
+        
+        logger.info("✅ Token exchange successful, scope: %s", token_response.get('scope', 'N/A'))
+        
+        return TokenResponse(
+            access_token=token_response["access_token"],
+            token_type=token_response.get("token_type", "Bearer"),
+            expires_in=token_response.get("expires_in", 3600),
+            scope=token_response.get("scope", "")
+        )
+        
     except httpx.RequestError as e:
-        print(f"❌ Network error during token exchange: {e}")
+        logger.error("❌ Network error during token exchange: %s", e)
         raise HTTPException(
             status_code=502,
             detail="Failed to connect to Google OAuth server"
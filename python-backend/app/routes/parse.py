@@ -1,16 +1,65 @@
 """Document parsing endpoints with multi-format support"""
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
 import tempfile
 import os
 import re
 import zipfile
 import io
+import logging
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
 
 from app.config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Threads for blocking parse work (zip inflate + XML, DOCX, workbook and CSV
+# loading and formatting), off the event loop
+PARSE_THREADS = min(8, os.cpu_count() or 1)
+_PARSE_POOL = ThreadPoolExecutor(max_workers=PARSE_THREADS, thread_name_prefix="parse")
+
+# Precompiled patterns: whitespace runs, space/tab runs within a line,
+# and PPTX slide/notes parts (slide number captured)
+WHITESPACE_RE = re.compile(r'\s+')
+INLINE_SPACE_RE = re.compile(r'[ \t]+')
+SLIDE_PART_RE = re.compile(r'ppt/slides/slide(\d+)\.xml$')
+NOTES_PART_RE = re.compile(r'ppt/notesSlides/notesSlide\d+\.xml$')
+
+# Workbooks are read with the Rust calamine engine when installed (much faster
+# than pandas' default, pure-Python openpyxl); None keeps the pandas default.
+# pandas only accepts engine="calamine" from 2.2, so older versions keep openpyxl
+try:
+    import python_calamine  # noqa: F401
+    from importlib.metadata import version
+    _PANDAS_VERSION = tuple(int(part) for part in version("pandas").split(".")[:2])
+    EXCEL_ENGINE = "calamine" if _PANDAS_VERSION >= (2, 2) else None
+except (ImportError, ValueError):  # not installed, or an unparseable version
+    EXCEL_ENGINE = None
+
+# PDF text comes from PyMuPDF (C, much faster) when installed, else pypdf.
+# PyMuPDF is AGPL, so it is an optional extra (requirements-fast.txt). It is
+# not thread-safe and holds the GIL while parsing, so calls are serialized
+# with a lock: parallel parse threads would gain nothing and can crash it
+try:
+    import fitz
+except ImportError:
+    fitz = None
+_FITZ_LOCK = threading.Lock()
+
+# Scanned pages are sent to Gemini Vision as JPEG at this quality
+OCR_JPEG_QUALITY = 85
+
+# DrawingML text run (<a:t>) in PPTX slide and notes XML
+PPTX_TEXT_TAG = "{http://schemas.openxmlformats.org/drawingml/2006/main}t"
+
+# Fallback for parts that aren't well-formed XML; allows attributes such as xml:space
+PPTX_TEXT_RE = re.compile(r'<a:t(?:\s[^>]*)?>([^<]*)</a:t>')
 
 
 @router.post("/parse-file")
@@ -26,22 +75,35 @@ async def parse_file(
     
     text, metadata = await parse_content(content, mime, filename)
     
-    # Clean up text
-    text = re.sub(r'\s+', ' ', text).strip()
+    # "structured" only steers whitespace cleanup; keep it out of the response
+    text = clean_whitespace(text, metadata.pop("structured", False))
     
-    print(f"✅ Parsed {len(text)} characters from {filename}")
+    logger.debug("✅ Parsed %s characters from %s", len(text), filename)
     return {"text": text, "length": len(text), "metadata": metadata}
 
 
+def clean_whitespace(text: str, structured: bool) -> str:
+    """
+    Collapse whitespace runs to single spaces. Structured output ([PAGE N]
+    markers, tables, headings) keeps its line breaks; only runs of
+    spaces/tabs are collapsed.
+    """
+    if structured:
+        return INLINE_SPACE_RE.sub(' ', text).strip()
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
 async def parse_content(content: bytes, mime: str, filename: str = "") -> Tuple[str, Dict[str, Any]]:
     """
     Parse content based on MIME type.
-    Returns (text, metadata) tuple.
+    Returns (text, metadata) tuple; the internal metadata["structured"] is
+    False for plain text, whose line breaks carry no meaning (callers pop it
+    before returning metadata to clients).
     """
     mime_lower = mime.lower()
-    metadata = {"filename": filename}
+    metadata = {"filename": filename, "structured": True}
     
-    print(f"📄 Parsing: {filename} ({mime})")
+    logger.debug("📄 Parsing: %s (%s)", filename, mime)
     
     try:
         # PDF
@@ -77,10 +139,12 @@ async def parse_content(content: bytes, mime: str, filename: str = "") -> Tuple[
         # Plain text / Markdown
         elif "text" in mime_lower:
             text = content.decode("utf-8", errors="ignore")
+            metadata["structured"] = False
             return text, metadata
         
         # Default: try as text
         else:
+            metadata["structured"] = False
             try:
                 text = content.decode("utf-8", errors="ignore")
                 return text, metadata
@@ -88,28 +152,41 @@ async def parse_content(content: bytes, mime: str, filename: str = "") -> Tuple[
                 return "[Unable to parse file format]", metadata
                 
     except Exception as e:
-        print(f"❌ Parse error: {str(e)}")
+        logger.error("❌ Parse error: %s", e)
         return f"[Parse error: {str(e)}]", metadata
 
 
+def extract_pdf_pages(content: bytes) -> List[str]:
+    """Text of each PDF page, via PyMuPDF when installed, else pypdf"""
+    if fitz is None:
+        from pypdf import PdfReader
+        return [page.extract_text() or "" for page in PdfReader(io.BytesIO(content)).pages]
+    
+    with _FITZ_LOCK:
+        doc = fitz.open(stream=content, filetype="pdf")
+        try:
+            return [page.get_text("text") for page in doc]
+        finally:
+            doc.close()
+
+
 async def parse_pdf_with_pages(content: bytes) -> str:
     """Parse PDF with page number markers"""
-    from pypdf import PdfReader
-    
     try:
-        reader = PdfReader(io.BytesIO(content))
+        pages = await asyncio.get_running_loop().run_in_executor(
+            _PARSE_POOL, extract_pdf_pages, content
+        )
         text_parts = []
         total_text = ""
         
-        for page_num, page in enumerate(reader.pages, 1):
-            page_text = page.extract_text()
+        for page_num, page_text in enumerate(pages, 1):
             if page_text and page_text.strip():
                 text_parts.append(f"[PAGE {page_num}]\n{page_text}")
                 total_text += page_text
         
         # Check for scanned PDF (minimal text)
         if len(total_text.strip()) < 100:
-            print("📄 PDF appears scanned, attempting Gemini Vision...")
+            logger.debug("📄 PDF appears scanned, attempting Gemini Vision...")
             return await parse_scanned_pdf_with_vision(content)
         
         return "\n\n".join(text_parts)
@@ -127,27 +204,36 @@ async def parse_scanned_pdf_with_vision(content: bytes) -> str:
         
         # This requires poppler - fallback to simple message if not available
         try:
-            images = pdf2image.convert_from_bytes(content, first_page=1, last_page=5)
+            images = await asyncio.to_thread(
+                pdf2image.convert_from_bytes, content, first_page=1, last_page=5
+            )
         except Exception:
             return "[Scanned PDF detected. Install poppler for OCR support.]"
         
         genai.configure(api_key=settings.GOOGLE_API_KEY)
         model = genai.GenerativeModel("gemini-2.5-flash-lite")
         
-        all_text = []
-        for i, img in enumerate(images[:5], 1):  # Limit to 5 pages
-            # Convert PIL to bytes
+        def ocr_page(img) -> str:
+            # JPEG is several times smaller than PNG for scanned pages, so uploads are faster
             img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_bytes = img_byte_arr.getvalue()
+            img.convert("RGB").save(img_byte_arr, format='JPEG', quality=OCR_JPEG_QUALITY)
             
             response = model.generate_content([
                 "Extract all text from this document page. Preserve the structure. If there are tables, format them clearly.",
-                {"mime_type": "image/png", "data": img_bytes}
+                {"mime_type": "image/jpeg", "data": img_byte_arr.getvalue()}
             ])
-            
-            if response.text:
-                all_text.append(f"[PAGE {i}]\n{response.text}")
+            return response.text
+        
+        # Pages are independent: OCR them concurrently (limit to 5 pages)
+        page_texts = await asyncio.gather(*[
+            asyncio.to_thread(ocr_page, img) for img in images[:5]
+        ])
+        
+        all_text = [
+            f"[PAGE {i}]\n{text}"
+            for i, text in enumerate(page_texts, 1)
+            if text
+        ]
         
         return "\n\n".join(all_text) if all_text else "[Could not extract text from scanned PDF]"
         
@@ -155,78 +241,94 @@ async def parse_scanned_pdf_with_vision(content: bytes) -> str:
         return f"[Scanned PDF vision parsing failed: {str(e)}]"
 
 
-async def parse_excel(content: bytes, filename: str = "") -> str:
-    """Parse Excel using pandas - Markdown for small, Row-based for large"""
+def format_rows(df) -> List[str]:
+    """
+    "Row N: col: value, ..." for every row with at least one value.
+    Built column by column (one astype/notna per column) instead of
+    iterrows(), which boxes each row into a Series.
+    """
+    columns = [
+        zip(df.iloc[:, i].notna().tolist(), (f"{col}: " + df.iloc[:, i].astype(str)).tolist())
+        for i, col in enumerate(df.columns)
+    ]
+    rows = []
+    for idx, cells in zip(df.index, zip(*columns)):
+        row_text = ", ".join([text for present, text in cells if present])
+        if row_text:
+            rows.append(f"Row {idx + 1}: {row_text}")
+    return rows
+
+
+def extract_excel_text(content: bytes) -> str:
+    """Every sheet as a Markdown table (small) or row lines (large); runs in the parse pool"""
     import pandas as pd
     
-    try:
-        # Read Excel
-        excel_file = io.BytesIO(content)
-        
-        # Check all sheets
-        xl = pd.ExcelFile(excel_file)
-        all_text = []
+    # Read every sheet from one workbook load (reading sheet by sheet
+    # re-parsed the whole workbook each time)
+    sheets = pd.read_excel(io.BytesIO(content), sheet_name=None, engine=EXCEL_ENGINE)
+    all_text = []
+    
+    for sheet_name, df in sheets.items():
+        if df.empty:
+            continue
         
-        for sheet_name in xl.sheet_names:
-            df = pd.read_excel(excel_file, sheet_name=sheet_name)
-            
-            if df.empty:
-                continue
-            
-            all_text.append(f"## Sheet: {sheet_name}")
-            
-            # Small/Medium: Markdown table (< 50 rows)
-            if len(df) <= 50:
-                try:
-                    from tabulate import tabulate
-                    md_table = tabulate(df, headers='keys', tablefmt='pipe', showindex=False)
-                    all_text.append(md_table)
-                except:
-                    all_text.append(df.to_string())
-            
-            # Large: Row-based extraction
-            else:
-                columns = df.columns.tolist()
-                for idx, row in df.iterrows():
-                    row_text = ", ".join([f"{col}: {row[col]}" for col in columns if pd.notna(row[col])])
-                    if row_text:
-                        all_text.append(f"Row {idx + 1}: {row_text}")
+        all_text.append(f"## Sheet: {sheet_name}")
         
-        result = "\n\n".join(all_text)
-        return result if result else "[Excel file appears empty]"
+        # Small/Medium: Markdown table (< 50 rows)
+        if len(df) <= 50:
+            try:
+                from tabulate import tabulate
+                md_table = tabulate(df, headers='keys', tablefmt='pipe', showindex=False)
+                all_text.append(md_table)
+            except:
+                all_text.append(df.to_string())
         
+        # Large: Row-based extraction
+        else:
+            all_text.extend(format_rows(df))
+    
+    result = "\n\n".join(all_text)
+    return result if result else "[Excel file appears empty]"
+
+
+async def parse_excel(content: bytes, filename: str = "") -> str:
+    """Parse Excel using pandas - Markdown for small, Row-based for large"""
+    try:
+        # Workbook loading and row formatting are CPU-bound: keep them off the loop
+        return await asyncio.get_running_loop().run_in_executor(
+            _PARSE_POOL, extract_excel_text, content
+        )
     except Exception as e:
         return f"[Excel parsing failed: {str(e)}]"
 
 
-async def parse_csv(content: bytes) -> str:
-    """Parse CSV using pandas"""
+def extract_csv_text(content: bytes) -> str:
+    """CSV as a Markdown table (small) or row lines (large); runs in the parse pool"""
     import pandas as pd
     
+    df = pd.read_csv(io.BytesIO(content))
+    
+    if df.empty:
+        return "[CSV file is empty]"
+    
+    # Small: Markdown
+    if len(df) <= 50:
+        try:
+            from tabulate import tabulate
+            return tabulate(df, headers='keys', tablefmt='pipe', showindex=False)
+        except:
+            return df.to_string()
+    
+    # Large: Row-based
+    return "\n".join(format_rows(df))
+
+
+async def parse_csv(content: bytes) -> str:
+    """Parse CSV using pandas"""
     try:
-        df = pd.read_csv(io.BytesIO(content))
-        
-        if df.empty:
-            return "[CSV file is empty]"
-        
-        # Small: Markdown
-        if len(df) <= 50:
-            try:
-                from tabulate import tabulate
-                return tabulate(df, headers='keys', tablefmt='pipe', showindex=False)
-            except:
-                return df.to_string()
-        
-        # Large: Row-based
-        columns = df.columns.tolist()
-        rows = []
-        for idx, row in df.iterrows():
-            row_text = ", ".join([f"{col}: {row[col]}" for col in columns if pd.notna(row[col])])
-            if row_text:
-                rows.append(f"Row {idx + 1}: {row_text}")
-        
-        return "\n".join(rows)
-        
+        return await asyncio.get_running_loop().run_in_executor(
+            _PARSE_POOL, extract_csv_text, content
+        )
     except Exception as e:
         return f"[CSV parsing failed: {str(e)}]"
 
@@ -250,7 +352,7 @@ async def parse_image(content: bytes, mime_type: str) -> str:
             2. If it's a chart/diagram, describe what it shows with data points.
             3. If it's a photo, describe the contents in detail.
             Be thorough - this description will be used for search.""",
-            {"mime_type": mime_type, "data": content}
+            {"mime_type": mime_type, "data": bytes(content)}  # Drive downloads arrive as bytearray
         ])
         
         if response.text:
@@ -262,32 +364,70 @@ async def parse_image(content: bytes, mime_type: str) -> str:
         return f"[Image parsing failed: {str(e)}]"
 
 
+def extract_pptx_text(zf: zipfile.ZipFile, name: str) -> str:
+    """
+    Text runs of one slide/notes part, streamed through iterparse (no full
+    XML string). A malformed part falls back to a regex scan instead of
+    failing the whole deck.
+    """
+    texts = []
+    try:
+        with zf.open(name) as fp:
+            for _, elem in ET.iterparse(fp, events=("end",)):
+                if elem.tag == PPTX_TEXT_TAG and elem.text:
+                    text = elem.text.strip()
+                    if text:
+                        texts.append(text)
+                elem.clear()
+    except ET.ParseError as e:
+        logger.warning("⚠️ Malformed XML in %s (%s), using regex fallback", name, e)
+        xml_content = zf.read(name).decode('utf-8', errors='ignore')
+        texts = [
+            text for text in (unescape(m).strip() for m in PPTX_TEXT_RE.findall(xml_content))
+            if text
+        ]
+    return ' '.join(texts)
+
+
 async def parse_pptx(content: bytes, filename: str = "") -> str:
     """Parse PPTX using zipfile and XML parsing"""
     try:
         text_parts = [f"[File Name: {filename}]"] if filename else []
         
+        loop = asyncio.get_running_loop()
+        
+        # One ZipFile shared by the slide workers: zipfile serializes reads of the
+        # underlying buffer, so the deck bytes are held once however many threads
+        # run. (Per-thread ZipFile(io.BytesIO(memoryview(content))) would not be
+        # zero-copy: BytesIO only shares an immutable bytes object, and copies
+        # anything else, memoryviews and Drive's bytearrays included.)
         with zipfile.ZipFile(io.BytesIO(content)) as zf:
-            slide_files = sorted([
-                f for f in zf.namelist() 
-                if re.match(r'ppt/slides/slide\d+\.xml$', f)
-            ], key=lambda x: int(re.search(r'slide(\d+)', x).group(1)))
+            # One match both filters slide parts and yields the slide number to sort on
+            slide_parts = sorted(
+                (int(m.group(1)), m.string)
+                for m in map(SLIDE_PART_RE.match, zf.namelist()) if m
+            )
+            slide_files = [f for _, f in slide_parts]
             
-            for slide_num, slide_file in enumerate(slide_files, 1):
-                xml_content = zf.read(slide_file).decode('utf-8')
-                matches = re.findall(r'<a:t>([^<]*)</a:t>', xml_content)
-                slide_text = ' '.join([m.strip() for m in matches if m.strip()])
+            # Slides are independent zip members; extract them in parallel, in order
+            slide_texts = await asyncio.gather(*[
+                loop.run_in_executor(_PARSE_POOL, extract_pptx_text, zf, slide_file)
+                for slide_file in slide_files
+            ])
+            
+            for slide_num, slide_text in enumerate(slide_texts, 1):
                 if slide_text:
                     text_parts.append(f"[SLIDE {slide_num}]\n{slide_text}")
             
             # Notes
-            notes_files = [f for f in zf.namelist() 
-                         if re.match(r'ppt/notesSlides/notesSlide\d+\.xml$', f)]
+            notes_files = [f for f in zf.namelist() if NOTES_PART_RE.match(f)]
             
-            for notes_file in notes_files:
-                xml_content = zf.read(notes_file).decode('utf-8')
-                matches = re.findall(r'<a:t>([^<]*)</a:t>', xml_content)
-                notes_text = ' '.join([m.strip() for m in matches if m.strip()])
+            notes_texts = await asyncio.gather(*[
+                loop.run_in_executor(_PARSE_POOL, extract_pptx_text, zf, notes_file)
+                for notes_file in notes_files
+            ])
+            
+            for notes_text in notes_texts:
                 if notes_text:
                     text_parts.append(f"[NOTES]\n{notes_text}")
         
@@ -297,33 +437,40 @@ async def parse_pptx(content: bytes, filename: str = "") -> str:
         return f"[PPTX parsing failed: {str(e)}]"
 
 
-async def parse_docx(content: bytes) -> str:
-    """Parse DOCX using python-docx"""
+def extract_docx_text(content: bytes) -> str:
+    """Paragraphs (headings marked) and tables of a DOCX; runs in the parse pool"""
     from docx import Document
     
+    doc = Document(io.BytesIO(content))
+    text_parts = []
+        
+    for para in doc.paragraphs:
+        if para.text.strip():
+            # Check if it's a heading
+            if para.style and 'Heading' in para.style.name:
+                text_parts.append(f"\n## {para.text}\n")
+            else:
+                text_parts.append(para.text)
+    
+    # Also extract tables
+    for table in doc.tables:
+        table_text = []
+        for row in table.rows:
+            row_text = " | ".join([cell.text.strip() for cell in row.cells])
+            table_text.append(row_text)
+        if table_text:
+            text_parts.append("\n" + "\n".join(table_text) + "\n")
+    
+    return '\n'.join(text_parts)
+
+
+async def parse_docx(content: bytes) -> str:
+    """Parse DOCX using python-docx"""
     try:
-        doc = Document(io.BytesIO(content))
-        text_parts = []
-        
-        for para in doc.paragraphs:
-            if para.text.strip():
-                # Check if it's a heading
-                if para.style and 'Heading' in para.style.name:
-                    text_parts.append(f"\n## {para.text}\n")
-                else:
-                    text_parts.append(para.text)
-        
-        # Also extract tables
-        for table in doc.tables:
-            table_text = []
-            for row in table.rows:
-                row_text = " | ".join([cell.text.strip() for cell in row.cells])
-                table_text.append(row_text)
-            if table_text:
-                text_parts.append("\n" + "\n".join(table_text) + "\n")
-        
-        return '\n'.join(text_parts)
-        
+        # Unzipping and walking the document XML is blocking: keep it off the loop
+        return await asyncio.get_running_loop().run_in_executor(
+            _PARSE_POOL, extract_docx_text, content
+        )
     except Exception as e:
         return f"[DOCX parsing failed: {str(e)}]"
 
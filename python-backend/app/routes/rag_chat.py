@@ -6,10 +6,18 @@ Combines memory + document retrieval automatically
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
-import json
+from typing import Any, AsyncIterator, List, Dict, Optional
+import asyncio
+import logging
+import orjson
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Chain output buffered ahead of a slow SSE client
+STREAM_BUFFER_SIZE = 32
+
+_STREAM_END = object()
 
 class RAGChatRequest(BaseModel):
     query: str
@@ -23,6 +31,37 @@ class RAGChatResponse(BaseModel):
     session_id: str
 
 
+async def prefetch(stream: AsyncIterator[Any], maxsize: int = STREAM_BUFFER_SIZE) -> AsyncIterator[Any]:
+    """
+    Iterate a stream through a bounded queue filled by a background task, so
+    the producer keeps running while the consumer waits on the client socket.
+    Producer errors are re-raised to the consumer; closing the consumer
+    cancels the producer.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    
+    async def produce():
+        try:
+            async for item in stream:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_STREAM_END)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+
+
 @router.post("/chat", response_model=RAGChatResponse)
 async def rag_chat(request: RAGChatRequest):
     """
@@ -50,7 +89,7 @@ async def rag_chat(request: RAGChatRequest):
         )
         
     except Exception as e:
-        print(f"❌ RAG Chat error: {str(e)}")
+        logger.error("❌ RAG Chat error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -70,24 +109,70 @@ async def rag_chat_stream(request: RAGChatRequest):
             
             chain = get_rag_chain(request.session_id, namespace)
             
-            # Stream response
-            async for chunk in chain.astream({"question": request.query}):
+            # Stream response (the chain runs ahead of the client by up to STREAM_BUFFER_SIZE chunks)
+            async for chunk in prefetch(chain.astream({"question": request.query})):
                 if "answer" in chunk:
-                    data = json.dumps({
+                    data = orjson.dumps({
                         "choices": [{
                             "delta": {"content": chunk["answer"]},
                             "finish_reason": None
                         }]
                     })
-                    yield f"data: {data}\n\n"
+                    yield b"data: " + data + b"\n\n"
+            
+            yield b"data: [DONE]\n\n"
+            
+        except Exception as e:
+            logger.error("❌ Stream error: %s", e)
+            error_data = orjson.dumps({"error": str(e)})
+            yield b"data: " + error_data + b"\n\n"
+            yield b"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive"
+        }
+    )
+
+
+@router.post("/chat/advanced/stream")
+async def rag_chat_advanced_stream(request: RAGChatRequest):
+    """
+    Stream Advanced RAG chat response with memory
+    Answer synthesis starts while reranking is still running
+    """
+    async def generate():
+        try:
+            from app.chains.advanced_rag import astream_with_advanced_memory
+            
+            # Determine namespace
+            namespace = request.namespace
+            if request.meeting_id:
+                namespace = f"meeting:{request.meeting_id}"
+            
+            async for text in astream_with_advanced_memory(
+                query=request.query,
+                session_id=request.session_id,
+                namespace=namespace
+            ):
+                data = orjson.dumps({
+                    "choices": [{
+                        "delta": {"content": text},
+                        "finish_reason": None
+                    }]
+                })
+                yield b"data: " + data + b"\n\n"
             
-            yield "data: [DONE]\n\n"
+            yield b"data: [DONE]\n\n"
             
         except Exception as e:
-            print(f"❌ Stream error: {str(e)}")
-            error_data = json.dumps({"error": str(e)})
-            yield f"data: {error_data}\n\n"
-            yield "data: [DONE]\n\n"
+            logger.error("❌ Advanced stream error: %s", e)
+            error_data = orjson.dumps({"error": str(e)})
+            yield b"data: " + error_data + b"\n\n"
+            yield b"data: [DONE]\n\n"
     
     return StreamingResponse(
         generate(),
@@ -119,9 +204,11 @@ async def get_chat_history(session_id: str):
 async def clear_chat_history(session_id: str):
     """Clear conversation history for a session"""
     try:
-        from app.chains.chain_utils import clear_session_memory
+        from app.chains.chain_utils import clear_session_memory, clear_stream_session_memory
         
+        # /chat/stream keeps its own memories and cached chains; evict those too
         cleared = clear_session_memory(session_id)
+        cleared = clear_stream_session_memory(session_id) or cleared
         return {
             "success": cleared,
             "message": f"Memory {'cleared' if cleared else 'not found'} for session {session_id}"
@@ -3,14 +3,37 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
+from dataclasses import dataclass
+from cachetools import TTLCache
 import httpx
 from bs4 import BeautifulSoup
 import hashlib
+import logging
 import re
 
-from app.config import settings
+from app.http_clients import get_scrape_client
+from app.pinecone_upsert import batch_upsert
+
+# selectolax (Lexbor, C) extracts page text far faster than BeautifulSoup's
+# pure-Python html.parser; BeautifulSoup remains the fallback
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Page bodies are read up to this size; the rest (usually boilerplate) is dropped
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+
+# Elements that never hold page content
+BOILERPLATE_TAGS = ['script', 'style', 'nav', 'footer', 'header', 'aside']
+
+# Last upserted content per page: (namespace, url) -> sha256(page text).
+# A re-scrape with the same text skips embedding and upserting entirely.
+UPSERTED_PAGE_TTL_SECONDS = 24 * 3600
+upserted_pages: TTLCache = TTLCache(maxsize=10_000, ttl=UPSERTED_PAGE_TTL_SECONDS)
 
 
 class ScrapeRequest(BaseModel):
@@ -22,12 +45,27 @@ class ScrapeAndUpsertRequest(BaseModel):
     namespaceHint: Optional[str] = None
 
 
+@dataclass(slots=True)
+class ChunkMeta:
+    """Pinecone metadata for one scraped chunk (orjson serializes dataclasses natively)"""
+    url: str
+    hostname: str
+    title: str
+    chunkIndex: int
+    content: str
+    wordCount: int
+    source: str = "web"
+
+
 def clean_text(html: str) -> tuple[str, str]:
     """Extract clean text and title from HTML"""
+    if LexborHTMLParser is not None:
+        return clean_text_selectolax(html)
+    
     soup = BeautifulSoup(html, 'html.parser')
     
     # Remove script and style elements
-    for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
+    for element in soup(BOILERPLATE_TAGS):
         element.decompose()
     
     # Get title
@@ -47,21 +85,70 @@ def clean_text(html: str) -> tuple[str, str]:
     return title, text
 
 
+def clean_text_selectolax(html: str) -> tuple[str, str]:
+    """clean_text on selectolax: same boilerplate removal and main-content preference"""
+    tree = LexborHTMLParser(html)
+    
+    title_node = tree.css_first('title')
+    title = title_node.text() if title_node else ""
+    
+    for node in tree.css(', '.join(BOILERPLATE_TAGS)):
+        node.decompose()
+    
+    main_content = tree.css_first('main') or tree.css_first('article') or tree.body
+    
+    if main_content:
+        text = main_content.text(separator=' ', strip=True)
+    else:
+        text = tree.root.text(separator=' ', strip=True) if tree.root else ""
+    
+    # Clean up whitespace
+    text = re.sub(r'\s+', ' ', text).strip()
+    
+    return title, text
+
+
 def chunk_text(text: str, chunk_size: int = 1400, overlap: int = 100) -> list[str]:
     """Split text into overlapping chunks"""
-    chunks = []
-    i = 0
-    while i < len(text):
-        end = min(i + chunk_size, len(text))
-        chunks.append(text[i:end])
-        if end == len(text):
-            break
-        i = end - overlap
-    return chunks
+    if not text:
+        return []
+    # Chunks start every (chunk_size - overlap) chars; the last one starts
+    # before len - overlap, so it is the first to reach the end of the text
+    starts = range(0, max(1, len(text) - overlap), chunk_size - overlap)
+    return [text[start:start + chunk_size] for start in starts]
+
+
+async def fetch_page(url: str) -> tuple[int, str]:
+    """
+    GET a page, streaming the body and stopping at MAX_PAGE_BYTES.
+    Returns (status code, decoded HTML); the HTML is empty unless the status is 200.
+    """
+    async with get_scrape_client().stream("GET", url) as response:
+        if response.status_code != 200:
+            return response.status_code, ""
+        
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) >= MAX_PAGE_BYTES:
+                logger.warning("⚠️ Page larger than %s bytes, truncated: %s", MAX_PAGE_BYTES, url)
+                del body[MAX_PAGE_BYTES:]
+                break
+        
+        encoding = response.charset_encoding or "utf-8"
+    
+    try:
+        return 200, body.decode(encoding, errors="ignore")
+    except LookupError:  # Unknown charset in Content-Type
+        return 200, body.decode("utf-8", errors="ignore")
 
 
 def vector_id_for(url: str, idx: int) -> str:
-    """Generate unique vector ID for URL chunk"""
+    """
+    Generate unique vector ID for URL chunk. The format is load-bearing:
+    re-scrapes overwrite existing vectors by ID, so changing it would leave
+    the previously indexed chunks behind as duplicates.
+    """
     h = hashlib.sha1(f"{url}#{idx}".encode()).hexdigest()
     return f"web_{h}_{idx}"
 
@@ -74,29 +161,23 @@ async def scrape_url(request: ScrapeRequest):
         raise HTTPException(status_code=400, detail="Invalid URL")
     
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.get(
-                request.url,
-                headers={"User-Agent": "Friday/1.0"},
-                follow_redirects=True
+        status_code, html = await fetch_page(request.url)
+        
+        if status_code != 200:
+            raise HTTPException(
+                status_code=status_code,
+                detail=f"Failed to fetch URL: {status_code}"
             )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to fetch URL: {response.status_code}"
-                )
-            
-            html = response.text
-            title, text = clean_text(html)
-            
-            return {
-                "title": title or request.url,
-                "url": request.url,
-                "text": text,
-                "length": len(text)
-            }
-            
+        
+        title, text = clean_text(html)
+        
+        return {
+            "title": title or request.url,
+            "url": request.url,
+            "text": text,
+            "length": len(text)
+        }
+        
     except httpx.TimeoutException:
         raise HTTPException(status_code=408, detail="Request timeout")
     except Exception as e:
@@ -111,81 +192,77 @@ async def scrape_and_upsert(request: ScrapeAndUpsertRequest):
         raise HTTPException(status_code=400, detail="Invalid URL")
     
     try:
-        from google import genai
         from urllib.parse import urlparse
-        
-        # Initialize client
-        client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+        from app.routes.embed import get_embeddings_batch, is_embeddable
         
         # Fetch and parse
-        async with httpx.AsyncClient(timeout=20.0) as http_client:
-            response = await http_client.get(
-                request.url,
-                headers={"User-Agent": "Friday/1.0"},
-                follow_redirects=True
-            )
-            
-            if response.status_code != 200:
-                return {"success": False, "upserted": 0, "reason": f"Fetch failed: {response.status_code}"}
-            
-            html = response.text
-            title, full_text = clean_text(html)
-            
-            if not full_text or len(full_text) < 50:
-                return {"success": False, "upserted": 0, "reason": "Empty page"}
+        status_code, html = await fetch_page(request.url)
+        
+        if status_code != 200:
+            return {"success": False, "upserted": 0, "reason": f"Fetch failed: {status_code}"}
+        
+        title, full_text = clean_text(html)
+        
+        if not full_text or len(full_text) < 50:
+            return {"success": False, "upserted": 0, "reason": "Empty page"}
         
         # Determine namespace
         hostname = urlparse(request.url).hostname or "unknown"
         namespace = request.namespaceHint or f"web:{hostname}"
         
+        # Unchanged since the last upsert: nothing to embed
+        page_key = (namespace, request.url)
+        digest = hashlib.sha256(full_text.encode()).digest()
+        if upserted_pages.get(page_key) == digest:
+            logger.debug("✅ Page unchanged, skipping: %s", request.url)
+            return {
+                "success": True,
+                "upserted": 0,
+                "reason": "unchanged",
+                "namespace": namespace,
+                "title": title,
+                "url": request.url
+            }
+        
         # Chunk text
         chunks = chunk_text(full_text, 1400, 100)
         
-        # Generate embeddings and prepare vectors
-        vectors = []
+        # Generate embeddings (one API call per 100 chunks) and prepare vectors;
+        # API failures raise, so the page is never cached as indexed with gaps
+        embeddings = await get_embeddings_batch(chunks)
+        missing = sum(
+            1 for chunk, embedding in zip(chunks, embeddings)
+            if embedding is None and is_embeddable(chunk)
+        )
+        if missing:
+            raise Exception(f"{missing}/{len(chunks)} chunks failed to embed")
         
-        for i, chunk in enumerate(chunks):
-            # Get embedding using new API
-            result = client.models.embed_content(
-                model="gemini-embedding-001",
-                contents=chunk[:8000],
-                config={"output_dimensionality": 768}
-            )
-            embedding = list(result.embeddings[0].values)
-            
-            vectors.append({
-                "id": vector_id_for(request.url, i),
+        url = request.url
+        page_title = title or url
+        vectors = [
+            {
+                "id": vector_id_for(url, i),
                 "values": embedding,
-                "metadata": {
-                    "source": "web",
-                    "url": request.url,
-                    "hostname": hostname,
-                    "title": title or request.url,
-                    "chunkIndex": i,
-                    "content": chunk[:1000],
-                    "wordCount": len(chunk.split())
-                }
-            })
+                "metadata": ChunkMeta(
+                    url=url,
+                    hostname=hostname,
+                    title=page_title,
+                    chunkIndex=i,
+                    content=chunk[:1000],
+                    wordCount=len(chunk.split())
+                )
+            }
+            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+            if embedding is not None
+        ]
         
         if not vectors:
             return {"success": False, "upserted": 0, "reason": "No vectors generated"}
         
-        # Batch upsert to Pinecone
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{settings.PINECONE_INDEX_HOST}/vectors/upsert",
-                headers={
-                    "Api-Key": settings.PINECONE_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "vectors": vectors,
-                    "namespace": namespace
-                }
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Pinecone upsert failed: {response.text}")
+        # Batch upsert to Pinecone (size-capped batches, posted in parallel);
+        # only a fully upserted page is remembered as unchanged
+        await batch_upsert(vectors, namespace)
+        upserted_pages[page_key] = digest
         
         return {
             "success": True,
@@ -196,5 +273,5 @@ async def scrape_and_upsert(request: ScrapeAndUpsertRequest):
         }
         
     except Exception as e:
-        print(f"❌ Scrape-and-upsert error: {str(e)}")
+        logger.error("❌ Scrape-and-upsert error: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed: {str(e)}")
@@ -1,47 +1,101 @@
 """Vector search and upsert endpoints using Pinecone"""
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import BaseModel, Field, conlist
+from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+import hashlib
+from typing_extensions import NotRequired, TypedDict
+import asyncio
+import logging
+import time
+
 import httpx
+import orjson
 
 from app.config import settings
+from app.http_clients import get_pinecone_client, request_with_retry
+from app.ingest_ledger import forget_namespace
+from app.pinecone_upsert import batch_upsert
+from app.search_cache import search_cache
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Pinecone's recommended maximum vectors per upsert request
+UPSERT_BATCH_SIZE = 1000
+
+# Pinecone's maximum IDs per delete request, and delete batches in flight at once
+DELETE_BATCH_SIZE = 1000
+DELETE_CONCURRENCY = 8
+
+# Query embedding length bounds (index is 768-dim), checked before any Pinecone call
+MIN_EMBEDDING_DIM = 1
+MAX_EMBEDDING_DIM = 4096
+# Pinecone's maximum topK
+MAX_TOP_K = 10000
+
+# Index stats change slowly: serve them from memory for a few seconds
+STATS_TTL_SECONDS = 5.0
 
 class SearchRequest(BaseModel):
-    queryEmbedding: List[float]
-    topK: int = 5
+    queryEmbedding: conlist(float, min_length=MIN_EMBEDDING_DIM, max_length=MAX_EMBEDDING_DIM)
+    topK: int = Field(default=5, ge=1, le=MAX_TOP_K)
     includeMetadata: bool = True
     namespace: str = "meeting-assistant"
 
+class PineconeVector(TypedDict):
+    """
+    Upsert vector as Pinecone expects it. Validated into a plain dict (unknown
+    keys dropped) so it can be serialized without another copy.
+    """
+    id: str
+    values: List[float]
+    metadata: NotRequired[Dict[str, Any]]
+
 class UpsertRequest(BaseModel):
     namespace: str = "meeting-assistant"
-    vectors: List[Dict[str, Any]]
+    vectors: List[PineconeVector]
 
 class DeleteRequest(BaseModel):
     ids: List[str]
     namespace: str = ""
 
 
+# /stats single-flight: concurrent callers share one in-flight Pinecone request
+_stats_body: Optional[bytes] = None
+_stats_expires = 0.0
+# Pinecone's ETag for _stats_body (sent as If-None-Match) and the ETag we serve
+_stats_upstream_etag: Optional[str] = None
+_stats_etag: Optional[str] = None
+_stats_inflight: Optional[asyncio.Task] = None
+
+
+NAME_FIELDS = ("filename", "title", "name")
+
+
 def extract_clean_filename(metadata: Dict) -> str:
     """
     Extract a clean filename from metadata.
     Priority: filename > title > name > "Document"
     NEVER returns URLs.
     """
-    # Check multiple possible fields
-    possible_names = [
-        metadata.get("filename"),
-        metadata.get("title"),
-        metadata.get("name"),
-    ]
-    
+    # Non-string values are skipped anyway; dropping them keeps the key hashable
+    names = tuple(
+        name if isinstance(name, str) else None
+        for name in map(metadata.get, NAME_FIELDS)
+    )
+    return clean_filename_cached(names)
+
+
+@lru_cache(maxsize=8192)
+def clean_filename_cached(possible_names: Tuple[Optional[str], ...]) -> str:
+    """First usable name, memoized since the same chunks recur across searches"""
     for name in possible_names:
-        if name and isinstance(name, str):
+        if name:
             name = name.strip()
             # Skip if it's a URL
-            if name.startswith("http://") or name.startswith("https://"):
+            if name.startswith(("http://", "https://")):
                 continue
             # Skip if it's "Unknown"
             if name.lower() == "unknown":
@@ -55,177 +109,221 @@ def extract_clean_filename(metadata: Dict) -> str:
 async def search_vectors(request: SearchRequest):
     """Search Pinecone for similar vectors"""
     
-    if not request.queryEmbedding or not isinstance(request.queryEmbedding, list):
-        raise HTTPException(status_code=400, detail="Invalid query embedding")
+    logger.debug("🔍 Performing semantic search (topK: %s)...", request.topK)
     
-    print(f"🔍 Performing semantic search (topK: {request.topK})...")
+    cache_key = (request.namespace, request.topK, request.includeMetadata)
+    query_vector = None
+    if settings.SEARCH_CACHE_ENABLED:
+        query_vector = search_cache.normalize(request.queryEmbedding)
+        if query_vector is not None:
+            cached = search_cache.lookup(cache_key, query_vector)
+            if cached is not None:
+                logger.debug("⚡ Semantic cache hit (%s matches)", len(cached))
+                return cached
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.PINECONE_INDEX_HOST}/query",
-                headers={
-                    "Api-Key": settings.PINECONE_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "vector": request.queryEmbedding,
-                    "topK": request.topK,
-                    "includeMetadata": request.includeMetadata,
-                    "includeValues": False,
-                    "namespace": request.namespace
-                },
-                timeout=20.0
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Pinecone error: {response.text}")
-            
-            data = response.json()
-            matches = data.get("matches", [])
-            
-            print(f"✅ Found {len(matches)} matches")
-            
-            # Transform results
-            results = []
-            for match in matches:
-                meta = match.get("metadata", {})
-                
-                # Extract clean filename - NEVER return URLs
-                filename = extract_clean_filename(meta)
-                
-                results.append({
-                    "id": match.get("id", ""),
-                    "score": match.get("score", 0),
-                    "filename": filename,
-                    "chunkIndex": meta.get("chunkIndex", 0),
-                    "content": meta.get("content", ""),
-                    "metadata": meta
-                })
-            
-            return results
-            
-    except Exception as e:
-        print(f"❌ Search error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+        response = await get_pinecone_client().post(
+            "/query",
+            content=orjson.dumps({
+                "vector": request.queryEmbedding,
+                "topK": request.topK,
+                "includeMetadata": request.includeMetadata,
+                "includeValues": False,
+                "namespace": request.namespace
+            }),
+            timeout=20.0
+        )
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        logger.error("❌ Search error: Pinecone returned %s", e.response.status_code)
+        raise HTTPException(status_code=500, detail=f"Search failed: Pinecone error: {e.response.text}")
+    except httpx.HTTPError as e:
+        logger.error("❌ Search error: %r", e)
+        raise HTTPException(status_code=500, detail=f"Search failed: {e!r}")
+    
+    matches = orjson.loads(response.content).get("matches", [])
+    
+    logger.debug("✅ Found %s matches", len(matches))
+    
+    # Transform results (one comprehension; `for meta in (...,)` binds once per match)
+    # Clean filename - NEVER return URLs
+    results = [
+        {
+            "id": match.get("id", ""),
+            "score": match.get("score", 0),
+            "filename": extract_clean_filename(meta),
+            "chunkIndex": meta.get("chunkIndex", 0),
+            "content": meta.get("content", ""),
+            "metadata": meta
+        }
+        for match in matches
+        for meta in (match.get("metadata") or {},)
+    ]
+    
+    if query_vector is not None:
+        search_cache.store(cache_key, query_vector, results)
+    
+    return results
 
 
 @router.post("/upsert")
 async def upsert_vectors(request: UpsertRequest):
     """Upsert vectors to Pinecone"""
     
-    print("📥 Received upsert request")
-    print(f"🔍 Namespace: {request.namespace}")
-    print(f"📦 Number of vectors: {len(request.vectors)}")
+    logger.debug("📥 Received upsert request")
+    logger.debug("🔍 Namespace: %s", request.namespace)
+    logger.debug("📦 Number of vectors: %s", len(request.vectors))
     
     if not request.vectors:
         raise HTTPException(status_code=400, detail="No vectors provided")
     
     try:
-        async with httpx.AsyncClient() as client:
-            # Format vectors for Pinecone
-            formatted_vectors = [{
-                "id": v.get("id"),
-                "values": v.get("values"),
-                "metadata": v.get("metadata", {})
-            } for v in request.vectors]
-            
-            print(f"📤 Upserting {len(formatted_vectors)} vectors to Pinecone...")
-            
-            response = await client.post(
-                f"{settings.PINECONE_INDEX_HOST}/vectors/upsert",
-                headers={
-                    "Api-Key": settings.PINECONE_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "vectors": formatted_vectors,
-                    "namespace": request.namespace
-                },
-                timeout=30.0
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Pinecone error: {response.text}")
-            
-            result = response.json()
-            
-            print(f"✅ Successfully upserted {len(formatted_vectors)} vectors")
-            
-            return {
-                "success": True,
-                "upsertedCount": result.get("upsertedCount", len(formatted_vectors)),
-                "message": "Vectors successfully upserted to Pinecone"
-            }
-            
+        logger.debug("📤 Upserting %s vectors to Pinecone...", len(request.vectors))
+        
+        # Split into concurrent batches (also capped by request body size)
+        upserted_count = await batch_upsert(
+            request.vectors, request.namespace, batch_size=UPSERT_BATCH_SIZE
+        )
+        
+        logger.debug("✅ Successfully upserted %s vectors", len(request.vectors))
+        
+        return {
+            "success": True,
+            "upsertedCount": upserted_count,
+            "message": "Vectors successfully upserted to Pinecone"
+        }
+        
     except Exception as e:
-        print(f"❌ Upsert error: {str(e)}")
+        logger.error("❌ Upsert error: %s", e)
         raise HTTPException(status_code=500, detail=f"Upsert failed: {str(e)}")
 
 
+async def delete_id_batch(
+    client: httpx.AsyncClient,
+    ids: List[str],
+    namespace: str,
+    sem: asyncio.Semaphore
+) -> None:
+    """Delete one batch of IDs (retries 429/5xx with backoff)"""
+    async with sem:
+        response = await request_with_retry(
+            client,
+            "POST",
+            "/vectors/delete",
+            content=orjson.dumps({"ids": ids, "namespace": namespace}),
+            timeout=20.0
+        )
+    
+    if response.status_code != 200:
+        raise Exception(f"Pinecone error: {response.text}")
+
+
 @router.post("/delete")
 async def delete_vectors(request: DeleteRequest):
-    """Delete vectors from Pinecone"""
+    """Delete vectors from Pinecone in concurrent batches of DELETE_BATCH_SIZE IDs"""
     
     if not request.ids:
         raise HTTPException(status_code=400, detail="No IDs provided")
     
-    print(f"🗑️ Deleting {len(request.ids)} vectors from namespace: {request.namespace}")
+    logger.debug("🗑️ Deleting %s vectors from namespace: %s", len(request.ids), request.namespace)
     
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.PINECONE_INDEX_HOST}/vectors/delete",
-                headers={
-                    "Api-Key": settings.PINECONE_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "ids": request.ids,
-                    "namespace": request.namespace
-                },
-                timeout=20.0
+    client = get_pinecone_client()
+    sem = asyncio.Semaphore(DELETE_CONCURRENCY)
+    batches = [
+        request.ids[i:i + DELETE_BATCH_SIZE]
+        for i in range(0, len(request.ids), DELETE_BATCH_SIZE)
+    ]
+    outcomes = await asyncio.gather(*[
+        delete_id_batch(client, batch, request.namespace, sem) for batch in batches
+    ], return_exceptions=True)
+    
+    # Invalidate even on partial failure: some batches may have landed.
+    # The ledger can't map vector IDs back to files, so the whole namespace
+    # is forgotten and the next Drive sync re-checks it against Pinecone
+    search_cache.invalidate(request.namespace)
+    await forget_namespace(request.namespace)
+    
+    failures = [outcome for outcome in outcomes if outcome is not None]
+    deleted_count = sum(len(batch) for batch, outcome in zip(batches, outcomes) if outcome is None)
+    if failures:
+        logger.error("❌ Delete error: %s/%s batches failed: %s", len(failures), len(batches), failures[0])
+        raise HTTPException(
+            status_code=500,
+            detail=(
+                f"Delete failed: {len(failures)}/{len(batches)} batches failed "
+                f"({deleted_count} vectors deleted): {failures[0]}"
             )
-            
-            if response.status_code != 200:
-                raise Exception(f"Pinecone error: {response.text}")
-            
-            print(f"✅ Deleted {len(request.ids)} vectors")
-            
-            return {
-                "success": True,
-                "deletedCount": len(request.ids),
-                "message": "Vectors successfully deleted"
-            }
-            
-    except Exception as e:
-        print(f"❌ Delete error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+        )
+    
+    logger.debug("✅ Deleted %s vectors in %s batches", deleted_count, len(batches))
+    
+    return {
+        "success": True,
+        "deletedCount": deleted_count,
+        "message": "Vectors successfully deleted"
+    }
 
 
-@router.get("/stats")
-async def get_stats():
-    """Get Pinecone index statistics"""
+async def fetch_stats() -> bytes:
+    """
+    Raw describe_index_stats JSON from Pinecone. Revalidates with
+    If-None-Match when Pinecone sent an ETag, reusing the cached body on 304.
+    """
+    global _stats_upstream_etag
+    logger.debug("📊 Fetching Pinecone index statistics...")
+    
+    headers = {}
+    if _stats_body is not None and _stats_upstream_etag:
+        headers["If-None-Match"] = _stats_upstream_etag
     
-    print("📊 Fetching Pinecone index statistics...")
+    response = await get_pinecone_client().post(
+        "/describe_index_stats",
+        content=b"{}",
+        headers=headers,
+        timeout=10.0
+    )
+    
+    if response.status_code == 304 and _stats_body is not None:
+        return _stats_body
+    if response.status_code != 200:
+        raise Exception(f"Pinecone error: {response.text}")
+    
+    _stats_upstream_etag = response.headers.get("etag")
+    return response.content
+
+
+def finish_stats_fetch(task: asyncio.Task) -> None:
+    """Cache a successful stats fetch and clear the in-flight slot"""
+    global _stats_body, _stats_expires, _stats_etag, _stats_inflight
+    _stats_inflight = None
+    if not task.cancelled() and task.exception() is None:
+        body = task.result()
+        if body is not _stats_body:
+            _stats_body = body
+            _stats_etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        _stats_expires = time.monotonic() + STATS_TTL_SECONDS
+
+
+@router.get("/stats")
+async def get_stats(request: Request):
+    """Get Pinecone index statistics (ETag / If-None-Match aware)"""
+    global _stats_inflight
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.PINECONE_INDEX_HOST}/describe_index_stats",
-                headers={
-                    "Api-Key": settings.PINECONE_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={},
-                timeout=10.0
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Pinecone error: {response.text}")
-            
-            return response.json()
-            
+        if _stats_body is None or time.monotonic() >= _stats_expires:
+            if _stats_inflight is None:
+                _stats_inflight = asyncio.create_task(fetch_stats())
+                _stats_inflight.add_done_callback(finish_stats_fetch)
+            # Shielded so one disconnecting caller doesn't cancel the shared fetch
+            await asyncio.shield(_stats_inflight)
+        
+        body, etag = _stats_body, _stats_etag
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        # Already JSON: pass Pinecone's body through without decoding it
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
+        
     except Exception as e:
-        print(f"❌ Stats error: {str(e)}")
+        logger.error("❌ Stats error: %s", e)
         raise HTTPException(status_code=500, detail=f"Stats failed: {str(e)}")
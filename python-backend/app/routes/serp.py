@@ -1,10 +1,11 @@
 """SerpAPI proxy endpoint - ported from Node.js backend"""
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
 import httpx
 
 from app.config import settings
+from app.http_clients import get_serp_client
 
 router = APIRouter()
 
@@ -24,26 +25,26 @@ async def serp_search(request: SerpSearchRequest):
         raise HTTPException(status_code=400, detail="SERP_API_KEY not configured on server")
     
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.get(
-                "https://serpapi.com/search.json",
-                params={
-                    "engine": "google",
-                    "q": request.q,
-                    "api_key": settings.SERP_API_KEY,
-                    "num": "10"
-                }
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"SerpAPI error: {response.text[:500]}"
-                )
-            
-            return response.json()
-            
+        response = await get_serp_client().get(
+            "https://serpapi.com/search.json",
+            params={
+                "engine": "google",
+                "q": request.q,
+                "api_key": settings.SERP_API_KEY,
+                "num": "10"
+            }
+        )
     except httpx.TimeoutException:
         raise HTTPException(status_code=408, detail="SerpAPI request timeout")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {e!r}")
+    
+    # Relay SerpAPI's own status (outside the try, so it isn't rewrapped as a 500)
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"SerpAPI error: {response.text[:500]}"
+        )
+    
+    # Already JSON: pass SerpAPI's body through without decoding it
+    return Response(content=response.content, media_type="application/json")
@@ -0,0 +1,88 @@
+"""
+Semantic search cache - serves /search from the results of a recent,
+near-identical query embedding
+- Opt-in (settings.SEARCH_CACHE_ENABLED): a hit may answer a slightly different query
+- Every Pinecone write path (batch_upsert, delete_file_vectors, /delete)
+  invalidates the namespace it touched
+"""
+
+from typing import Dict, List, Optional, Tuple
+import time
+
+import numpy as np
+
+SEARCH_CACHE_SIZE = 4096
+SEARCH_CACHE_SIMILARITY = 0.97
+# Safety net for writes made outside this process
+SEARCH_CACHE_TTL_SECONDS = 300
+
+
+class SemanticSearchCache:
+    """
+    Ring buffer of unit-normalized query embeddings and their search results.
+    A lookup is one float32 matrix-vector product over the buffer; a prior
+    query with cosine similarity >= threshold (same namespace, topK and
+    includeMetadata) is served without calling Pinecone.
+    """
+
+    def __init__(
+        self,
+        maxlen: int = SEARCH_CACHE_SIZE,
+        threshold: float = SEARCH_CACHE_SIMILARITY,
+        ttl: float = SEARCH_CACHE_TTL_SECONDS
+    ):
+        self.maxlen = maxlen
+        self.threshold = threshold
+        self.ttl = ttl
+        self.clear()
+
+    def clear(self) -> None:
+        self._vectors: Optional[np.ndarray] = None
+        # Per slot: (key, expires_at, results), or None once invalidated
+        self._entries: List[Optional[Tuple[Tuple, float, List[Dict]]]] = []
+        self._next = 0
+
+    @staticmethod
+    def normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def lookup(self, key: Tuple, vector: np.ndarray) -> Optional[List[Dict]]:
+        """Cached results for the most similar live entry with the same key"""
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            return None
+        
+        sims = self._vectors[:len(self._entries)] @ vector
+        candidates = np.flatnonzero(sims >= self.threshold)
+        now = time.monotonic()
+        for i in candidates[np.argsort(-sims[candidates])]:
+            entry = self._entries[i]
+            if entry is not None and entry[0] == key and entry[1] > now:
+                return entry[2]
+        return None
+
+    def store(self, key: Tuple, vector: np.ndarray, results: List[Dict]) -> None:
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            # First entry (or the embedding model changed): allocate the buffer
+            self.clear()
+            self._vectors = np.zeros((self.maxlen, vector.shape[0]), dtype=np.float32)
+        
+        slot = self._next
+        self._vectors[slot] = vector
+        entry = (key, time.monotonic() + self.ttl, results)
+        if slot == len(self._entries):
+            self._entries.append(entry)
+        else:
+            self._entries[slot] = entry
+        self._next = (slot + 1) % self.maxlen
+
+    def invalidate(self, namespace: str) -> None:
+        """Drop every cached result for a namespace (after upserts/deletes)"""
+        for i, entry in enumerate(self._entries):
+            if entry is not None and entry[0][0] == namespace:
+                self._entries[i] = None
+                self._vectors[i] = 0
+
+
+search_cache = SemanticSearchCache()
@@ -0,0 +1,29 @@
+"""
+Shared test setup: placeholder credentials so app.config loads without a
+.env file, and the backend root on sys.path so `import app` resolves.
+"""
+
+import os
+import sys
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("PINECONE_API_KEY", "test-key")
+os.environ.setdefault("PINECONE_INDEX_HOST", "https://index.test")
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_ROOT)
+
+import pytest  # noqa: E402
+
+from app import ingest_ledger  # noqa: E402
+from app.config import settings  # noqa: E402
+
+
+@pytest.fixture
+def ledger_path(tmp_path, monkeypatch):
+    """Point the ingest ledger at a fresh database for one test"""
+    ingest_ledger.close_ledger()
+    path = tmp_path / "ledger.db"
+    monkeypatch.setattr(settings, "INGEST_LEDGER_PATH", str(path))
+    yield path
+    ingest_ledger.close_ledger()
@@ -0,0 +1,33 @@
+"""Multi-query de-duplication in the advanced RAG retriever"""
+
+from langchain_core.documents import Document
+
+from app.chains.advanced_rag import ParallelMultiQueryRetriever, doc_key
+
+
+def test_doc_key_prefers_vector_id():
+    assert doc_key(Document(id="vec-1", page_content="a")) == "vec-1"
+    assert doc_key(Document(id="vec-1", page_content="b")) == "vec-1"
+
+
+def test_doc_key_falls_back_to_content_hash():
+    first = doc_key(Document(page_content="same text"))
+    assert first == doc_key(Document(page_content="same text"))
+    assert first != doc_key(Document(page_content="other text"))
+
+
+def test_unique_union_keeps_first_occurrence_in_order():
+    docs = [
+        Document(id="a", page_content="one"),
+        Document(id="b", page_content="two"),
+        Document(id="a", page_content="one (again)"),
+        Document(page_content="no id"),
+        Document(page_content="no id"),
+        Document(id="c", page_content="three"),
+    ]
+
+    # unique_union does not touch retriever state, so skip model validation
+    retriever = ParallelMultiQueryRetriever.model_construct()
+    unique = retriever.unique_union(docs)
+
+    assert [doc.page_content for doc in unique] == ["one", "two", "no id", "three"]
@@ -0,0 +1,82 @@
+"""Local token estimation and pruning in the chat summary memory, session eviction"""
+
+from langchain_core.language_models import FakeListLLM
+
+from app.chains import chain_utils
+from app.chains.chain_utils import SummaryBufferMemory
+
+
+def make_memory(max_token_limit: int) -> SummaryBufferMemory:
+    return SummaryBufferMemory(
+        llm=FakeListLLM(responses=["summary"]),
+        memory_key="chat_history",
+        return_messages=True,
+        max_token_limit=max_token_limit,
+    )
+
+
+def add_turns(memory: SummaryBufferMemory, count: int, size: int = 40) -> None:
+    for i in range(count):
+        memory.chat_memory.add_user_message(f"q{i}".ljust(size, "."))
+        memory.chat_memory.add_ai_message(f"a{i}".ljust(size, "."))
+
+
+def test_estimate_tokens_is_chars_over_four():
+    memory = make_memory(100)
+    add_turns(memory, 1, size=40)
+    assert memory.estimate_tokens(memory.chat_memory.messages) == 20
+
+
+def test_pop_over_limit_removes_oldest_turns_first():
+    # Each turn is 80 chars = 20 tokens; a 45 token budget fits two turns
+    memory = make_memory(45)
+    add_turns(memory, 4)
+
+    pruned = memory.pop_over_limit()
+
+    assert [msg.content[:2] for msg in pruned] == ["q0", "a0", "q1", "a1"]
+    assert [msg.content[:2] for msg in memory.chat_memory.messages] == ["q2", "a2", "q3", "a3"]
+
+
+def test_pop_over_limit_noop_within_budget():
+    memory = make_memory(1000)
+    add_turns(memory, 3)
+
+    assert memory.pop_over_limit() == []
+    assert len(memory.chat_memory.messages) == 6
+
+
+def test_pop_over_limit_keeps_latest_turn_even_if_oversized():
+    memory = make_memory(5)
+    add_turns(memory, 3, size=400)
+
+    pruned = memory.pop_over_limit()
+
+    assert len(pruned) == 4
+    assert [msg.content[:2] for msg in memory.chat_memory.messages] == ["q2", "a2"]
+
+
+def test_prune_folds_pruned_turns_into_summary():
+    memory = make_memory(25)
+    add_turns(memory, 2)
+
+    memory.prune()
+
+    assert memory.moving_summary_buffer == "summary"
+    assert len(memory.chat_memory.messages) == 2
+
+
+def test_clear_stream_session_evicts_memory_and_chains():
+    memory = make_memory(100)
+    add_turns(memory, 1)
+    chain_utils.stream_session_memories["s1"] = memory
+    chain_utils.stream_session_chains["s1:documents"] = object()
+    chain_utils.stream_session_chains["s10:documents"] = object()
+
+    assert chain_utils.clear_stream_session_memory("s1") is True
+    assert memory.chat_memory.messages == []
+    assert "s1" not in chain_utils.stream_session_memories
+    assert list(chain_utils.stream_session_chains.keys()) == ["s10:documents"]
+    assert chain_utils.clear_stream_session_memory("s1") is False
+
+    chain_utils.stream_session_chains.clear()
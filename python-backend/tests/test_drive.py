@@ -0,0 +1,220 @@
+"""Drive sync: chunking, vector building and the incremental ingest ledger"""
+
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from app import ingest_ledger
+from app.routes import drive, search
+from app.routes.drive import SyncRequest, chunk_text_smart
+
+PDF = "application/pdf"
+
+
+# chunk_text_smart
+
+def test_pdf_chunks_carry_marker_page_numbers():
+    # parse_content skips empty pages, so numbers can jump
+    text = "[PAGE 1]\nIntro notes\n[PAGE 2]\nAgenda\n[PAGE 5]\nAction items"
+
+    chunks = chunk_text_smart(text, PDF)
+
+    assert [(c["text"], c["metadata"]["page_number"]) for c in chunks] == [
+        ("Intro notes", 1),
+        ("Agenda", 2),
+        ("Action items", 5),
+    ]
+
+
+def test_pdf_text_before_first_marker_counts_as_page_one():
+    chunks = chunk_text_smart("Cover sheet\n[PAGE 3]\nBody", PDF)
+
+    assert [(c["text"], c["metadata"]["page_number"]) for c in chunks] == [
+        ("Cover sheet", 1),
+        ("Body", 3),
+    ]
+
+
+def test_long_pdf_page_is_split_but_keeps_its_number():
+    text = "[PAGE 7]\n" + "Discussion point. " * 200
+
+    chunks = chunk_text_smart(text, PDF, chunk_size=200, overlap=20)
+
+    assert len(chunks) > 1
+    assert {c["metadata"]["page_number"] for c in chunks} == {7}
+    assert all(len(c["text"]) <= 200 for c in chunks)
+
+
+def test_spreadsheet_rows_are_chunks():
+    chunks = chunk_text_smart("a,b\n\nc,d\n", "text/csv")
+
+    assert chunks == [
+        {"text": "a,b", "metadata": {"row_index": 0}},
+        {"text": "c,d", "metadata": {"row_index": 2}},
+    ]
+
+
+# build_file_vectors
+
+def test_file_vectors_are_numbered_without_gaps():
+    file = {"id": "f1", "name": "sheet.csv", "mimeType": "text/csv", "modifiedTime": "t1"}
+    chunks = [{"text": "a,b", "metadata": {"row_index": i}} for i in range(4)]
+    # A short header row gets no embedding, like other non-embeddable chunks
+    embeddings = [None, np.ones(2, dtype=np.float32), None, np.ones(2, dtype=np.float32)]
+
+    vectors = drive.build_file_vectors("m1", file, chunks, embeddings)
+
+    assert [v["id"] for v in vectors] == ["m1_f1_0", "m1_f1_1"]
+    assert [v["metadata"]["chunkIndex"] for v in vectors] == [0, 1]
+    assert [v["metadata"]["row_index"] for v in vectors] == [1, 3]
+
+
+# Ingest ledger
+
+NAMESPACE = "meeting:m1"
+FILES = [
+    {"id": "f1", "name": "notes.txt", "mimeType": "text/plain", "modifiedTime": "t1"},
+    {"id": "f2", "name": "plan.txt", "mimeType": "text/plain", "modifiedTime": "t2"},
+]
+
+
+def test_ledger_round_trip_and_forget(ledger_path):
+    async def run():
+        await ingest_ledger.record_files(NAMESPACE, "m1", [("f1", "t1", "sha1"), ("f2", "t2", None)])
+        before = await ingest_ledger.load_ledger(NAMESPACE, "m1")
+        await ingest_ledger.forget_files(NAMESPACE, ["f1"])
+        after = await ingest_ledger.load_ledger(NAMESPACE, "m1")
+        other = await ingest_ledger.load_ledger("meeting:other", "m1")
+        return before, after, other
+
+    before, after, other = asyncio.run(run())
+
+    assert before == {"f1": ("t1", "sha1"), "f2": ("t2", None)}
+    assert after == {"f2": ("t2", None)}
+    assert other == {}
+
+
+def test_forget_namespace_keeps_other_namespaces(ledger_path):
+    async def run():
+        await ingest_ledger.record_files(NAMESPACE, "m1", [("f1", "t1", "sha1")])
+        await ingest_ledger.record_files("meeting:other", "m1", [("f1", "t1", "sha1")])
+        await ingest_ledger.forget_namespace(NAMESPACE)
+        return (
+            await ingest_ledger.load_ledger(NAMESPACE, "m1"),
+            await ingest_ledger.load_ledger("meeting:other", "m1"),
+        )
+
+    forgotten, kept = asyncio.run(run())
+
+    assert forgotten == {}
+    assert kept == {"f1": ("t1", "sha1")}
+
+
+@pytest.fixture
+def fake_drive(monkeypatch, ledger_path):
+    """
+    Stub out Drive and Pinecone for sync_drive_folder. `present` is what the
+    first-chunk fetch reports; downloads return too little text to index,
+    so the pipeline stops right after the download stage.
+    """
+    state = {"present": {}, "fetched": [], "downloads": []}
+
+    async def list_files(folder_id, access_token, client=None):
+        return [dict(f) for f in FILES]
+
+    async def indexed_times(file_ids, meeting_id, namespace):
+        state["fetched"].extend(file_ids)
+        return {f: t for f, t in state["present"].items() if f in file_ids}
+
+    async def download(file_id, mime_type, access_token):
+        state["downloads"].append(file_id)
+        return bytearray(b"tiny")
+
+    monkeypatch.setattr(drive, "list_files_recursive", list_files)
+    monkeypatch.setattr(drive, "get_indexed_modified_times", indexed_times)
+    monkeypatch.setattr(drive, "download_file", download)
+    return state
+
+
+@pytest.fixture
+def pinecone_ok(monkeypatch):
+    """Answer every Pinecone call with an empty 200"""
+    def get_client():
+        return httpx.AsyncClient(
+            base_url="https://index.test",
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})),
+        )
+
+    monkeypatch.setattr(drive, "get_pinecone_client", get_client)
+    monkeypatch.setattr(search, "get_pinecone_client", get_client)
+
+
+def sync():
+    request = SyncRequest(folderId="folder", accessToken="token", meetingId="m1")
+    return asyncio.run(drive.sync_drive_folder(request))
+
+
+def seed_ledger(rows):
+    asyncio.run(ingest_ledger.record_files(NAMESPACE, "m1", rows))
+
+
+def load():
+    return asyncio.run(ingest_ledger.load_ledger(NAMESPACE, "m1"))
+
+
+def test_unchanged_files_in_ledger_skip_pinecone_and_download(fake_drive):
+    seed_ledger([("f1", "t1", "sha1"), ("f2", "t2", "sha2")])
+
+    result = sync()
+
+    assert fake_drive["fetched"] == []
+    assert fake_drive["downloads"] == []
+    assert result.skippedCount == 2
+
+
+def test_modified_file_is_downloaded(fake_drive):
+    seed_ledger([("f1", "old", "sha1"), ("f2", "t2", "sha2")])
+
+    sync()
+
+    assert fake_drive["fetched"] == []
+    assert fake_drive["downloads"] == ["f1"]
+
+
+def test_files_missing_from_ledger_are_checked_and_backfilled(fake_drive):
+    seed_ledger([("f2", "t2", "sha2")])
+    fake_drive["present"] = {"f1": "t1"}
+
+    sync()
+
+    assert fake_drive["fetched"] == ["f1"]
+    assert fake_drive["downloads"] == []
+    assert load() == {"f1": ("t1", None), "f2": ("t2", "sha2")}
+
+
+def test_new_files_are_downloaded(fake_drive):
+    sync()
+
+    assert sorted(fake_drive["fetched"]) == ["f1", "f2"]
+    assert sorted(fake_drive["downloads"]) == ["f1", "f2"]
+
+
+def test_delete_file_vectors_forgets_ledger_row(fake_drive, pinecone_ok):
+    seed_ledger([("f1", "t1", "sha1"), ("f2", "t2", "sha2")])
+
+    asyncio.run(drive.delete_file_vectors("f1", NAMESPACE))
+
+    assert load() == {"f2": ("t2", "sha2")}
+
+
+def test_delete_route_forgets_namespace_and_next_sync_rechecks(fake_drive, pinecone_ok):
+    seed_ledger([("f1", "t1", "sha1"), ("f2", "t2", "sha2")])
+
+    asyncio.run(search.delete_vectors(search.DeleteRequest(ids=["m1_f1_0"], namespace=NAMESPACE)))
+    fake_drive["present"] = {"f2": "t2"}
+    sync()
+
+    assert sorted(fake_drive["fetched"]) == ["f1", "f2"]
+    assert fake_drive["downloads"] == ["f1"]
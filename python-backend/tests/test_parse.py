@@ -0,0 +1,145 @@
+"""Document parsing: PDF text through PyMuPDF and pypdf, and the pooled Office/CSV parsers"""
+
+import asyncio
+import io
+import threading
+
+import pytest
+
+from app.routes import parse
+
+PAGE_TEXTS = [
+    "Quarterly planning meeting. The team agreed on the launch date and owners.",
+    "",
+    "Action items: finalize the budget, confirm the venue, send the agenda to everyone.",
+]
+
+
+def make_pdf(texts):
+    """Minimal PDF with one Helvetica text line per page (empty string = blank page)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for text in texts:
+        stream = f"BT /F1 10 Tf 20 100 Td ({text}) Tj ET".encode() if text else b""
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 200] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), len(texts))
+
+    body = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(body)
+
+
+def assert_pages(pages):
+    assert len(pages) == len(PAGE_TEXTS)
+    for page, expected in zip(pages, PAGE_TEXTS):
+        assert page.strip() == expected
+
+
+def test_pypdf_fallback(monkeypatch):
+    monkeypatch.setattr(parse, "fitz", None)
+
+    assert_pages(parse.extract_pdf_pages(make_pdf(PAGE_TEXTS)))
+
+
+def test_pymupdf_path():
+    if parse.fitz is None:
+        pytest.skip("PyMuPDF not installed (requirements-fast.txt)")
+
+    assert_pages(parse.extract_pdf_pages(make_pdf(PAGE_TEXTS)))
+
+
+def test_concurrent_pdf_parses_keep_page_markers():
+    # Drive sync runs several parse workers at once; each lands on the
+    # parse thread pool, where PyMuPDF calls must not overlap
+    pdfs = [make_pdf([f"Document {i}. " + PAGE_TEXTS[0], "", PAGE_TEXTS[2]]) for i in range(16)]
+
+    async def run():
+        return await asyncio.gather(*[parse.parse_pdf_with_pages(pdf) for pdf in pdfs])
+
+    results = asyncio.run(run())
+
+    for i, text in enumerate(results):
+        assert text.startswith(f"[PAGE 1]\nDocument {i}.")
+        # Blank page 2 is skipped but page 3 keeps its own number
+        assert "[PAGE 2]" not in text
+        assert "[PAGE 3]\nAction items" in text
+
+
+# Office and CSV parsers run in the parse pool, not on the event loop
+
+def record_thread(monkeypatch, name):
+    """Wrap parse.<name> to note which thread it ran on"""
+    threads = []
+    original = getattr(parse, name)
+
+    def wrapper(*args):
+        threads.append(threading.current_thread().name)
+        return original(*args)
+
+    monkeypatch.setattr(parse, name, wrapper)
+    return threads
+
+
+def test_docx_is_parsed_off_the_loop(monkeypatch):
+    docx = pytest.importorskip("docx")
+    document = docx.Document()
+    document.add_heading("Decisions", level=1)
+    document.add_paragraph("Ship the beta on Friday.")
+    table = document.add_table(rows=1, cols=2)
+    table.rows[0].cells[0].text = "Owner"
+    table.rows[0].cells[1].text = "Sam"
+    buffer = io.BytesIO()
+    document.save(buffer)
+    threads = record_thread(monkeypatch, "extract_docx_text")
+
+    text = asyncio.run(parse.parse_docx(buffer.getvalue()))
+
+    assert "## Decisions" in text
+    assert "Ship the beta on Friday." in text
+    assert "Owner | Sam" in text
+    assert threads and threads[0].startswith("parse")
+
+
+def test_large_csv_is_formatted_off_the_loop(monkeypatch):
+    rows = "\n".join(f"{i},item {i}" for i in range(60))
+    threads = record_thread(monkeypatch, "format_rows")
+
+    text = asyncio.run(parse.parse_csv(f"id,name\n{rows}\n".encode()))
+
+    lines = text.split("\n")
+    assert len(lines) == 60
+    assert lines[0] == "Row 1: id: 0, name: item 0"
+    assert threads and threads[0].startswith("parse")
+
+
+def test_excel_is_read_and_formatted_off_the_loop(monkeypatch):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("openpyxl")
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        pd.DataFrame({"id": range(60)}).to_excel(writer, sheet_name="Big", index=False)
+        pd.DataFrame({"id": [1]}).to_excel(writer, sheet_name="Small", index=False)
+    monkeypatch.setattr(parse, "EXCEL_ENGINE", None)
+    threads = record_thread(monkeypatch, "format_rows")
+
+    text = asyncio.run(parse.parse_excel(buffer.getvalue()))
+
+    assert text.startswith("## Sheet: Big\n\nRow 1: id: 0")
+    assert "## Sheet: Small" in text
+    assert threads and threads[0].startswith("parse")
@@ -0,0 +1,78 @@
+"""Pinecone upsert bodies and the shared upsert module's import footprint"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import orjson
+
+from app.pinecone_upsert import build_upsert_bodies
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_vectors(count, dims=8):
+    return [
+        {
+            "id": f"m_f_{i}",
+            "values": np.full(dims, 0.5, dtype=np.float32),
+            "metadata": {"text": "x" * 50},
+        }
+        for i in range(count)
+    ]
+
+
+def decode(body):
+    return orjson.loads(body)
+
+
+def test_upsert_bodies_respect_batch_size():
+    bodies = build_upsert_bodies(make_vectors(250), "meeting:1", batch_size=100)
+
+    payloads = [decode(body) for body in bodies]
+    assert [len(p["vectors"]) for p in payloads] == [100, 100, 50]
+    assert all(p["namespace"] == "meeting:1" for p in payloads)
+
+
+def test_upsert_bodies_respect_max_bytes():
+    vectors = make_vectors(40, dims=64)
+    max_bytes = 4000
+
+    bodies = build_upsert_bodies(vectors, "meeting:1", batch_size=100, max_bytes=max_bytes)
+
+    assert len(bodies) > 1
+    assert all(len(body) <= max_bytes for body in bodies)
+    ids = [v["id"] for body in bodies for v in decode(body)["vectors"]]
+    assert ids == [v["id"] for v in vectors]
+
+
+def test_upsert_body_serializes_numpy_values():
+    (body,) = build_upsert_bodies(make_vectors(1, dims=3), 'ns "quoted"')
+
+    payload = decode(body)
+    assert payload["vectors"][0]["values"] == [0.5, 0.5, 0.5]
+    assert payload["namespace"] == 'ns "quoted"'
+
+
+def test_oversized_vector_gets_its_own_body():
+    bodies = build_upsert_bodies(make_vectors(3, dims=64), "ns", max_bytes=10)
+
+    assert [len(decode(body)["vectors"]) for body in bodies] == [1, 1, 1]
+
+
+def test_search_and_scrape_do_not_load_drive_sync():
+    # drive.py starts a process pool and opens the ingest ledger on import
+    code = (
+        "import sys, app.routes.search, app.routes.scrape; "
+        "print('app.routes.drive' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_ROOT,
+        env={**os.environ, "PYTHONPATH": BACKEND_ROOT},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
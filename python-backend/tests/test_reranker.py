@@ -0,0 +1,88 @@
+"""encode_pairs must build the same model inputs as the HF tokenizer"""
+
+import os
+
+import numpy as np
+import pytest
+
+from app.chains.reranker import encode_pairs
+
+MODEL_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "model_cache",
+    "ms-marco-TinyBERT-L-2-v2",
+)
+TOKENIZER_PATH = os.path.join(MODEL_DIR, "tokenizer.json")
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(TOKENIZER_PATH), reason="reranker model not downloaded"
+)
+
+PAIRS = [
+    ("what was decided about the budget?", "The team agreed to cut travel spend by 10%."),
+    ("who owns the launch", "Priya owns the launch checklist; Omar handles comms."),
+    ("deadline", "No date was fixed."),
+]
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    from tokenizers import Tokenizer
+
+    tok = Tokenizer.from_file(TOKENIZER_PATH)
+    tok.no_padding()
+    tok.no_truncation()
+    return tok
+
+
+def special_ids(tokenizer):
+    return tokenizer.token_to_id("[CLS]"), tokenizer.token_to_id("[SEP]")
+
+
+def ids(tokenizer, text):
+    return tokenizer.encode(text, add_special_tokens=False).ids
+
+
+def test_short_pairs_match_hf_encoding(tokenizer):
+    cls_id, sep_id = special_ids(tokenizer)
+    encoded = encode_pairs(
+        [(ids(tokenizer, q), ids(tokenizer, p)) for q, p in PAIRS], cls_id, sep_id
+    )
+
+    for row, (query, passage) in enumerate(PAIRS):
+        expected = tokenizer.encode(query, passage)
+        n = len(expected.ids)
+        assert encoded["input_ids"][row, :n].tolist() == expected.ids
+        assert encoded["token_type_ids"][row, :n].tolist() == expected.type_ids
+        assert encoded["attention_mask"][row, :n].tolist() == expected.attention_mask
+        # Padding past the pair is masked out
+        assert not encoded["attention_mask"][row, n:].any()
+        assert not encoded["input_ids"][row, n:].any()
+
+
+def test_long_pairs_truncate_to_max_length(tokenizer):
+    cls_id, sep_id = special_ids(tokenizer)
+    query = ids(tokenizer, "budget " * 20)
+    passage = ids(tokenizer, "the quarterly numbers were discussed at length " * 200)
+
+    encoded = encode_pairs([(query, passage)], cls_id, sep_id, max_length=512)
+
+    assert encoded["input_ids"].shape == (1, 512)
+    assert encoded["attention_mask"].all()
+    row = encoded["input_ids"][0].tolist()
+    # Short query is kept whole; the passage absorbs the truncation
+    assert row[:len(query) + 2] == [cls_id, *query, sep_id]
+    assert row[-1] == sep_id
+    assert np.count_nonzero(encoded["token_type_ids"][0] == 0) == len(query) + 2
+
+
+def test_long_query_is_capped_to_half_budget(tokenizer):
+    cls_id, sep_id = special_ids(tokenizer)
+    query = ids(tokenizer, "decision " * 600)
+    passage = ids(tokenizer, "notes " * 600)
+
+    encoded = encode_pairs([(query, passage)], cls_id, sep_id, max_length=128)
+
+    assert encoded["input_ids"].shape == (1, 128)
+    query_tokens = np.count_nonzero(encoded["token_type_ids"][0] == 0) - 2
+    assert query_tokens == (128 - 3) // 2
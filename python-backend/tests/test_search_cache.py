@@ -0,0 +1,111 @@
+"""Semantic /search cache hits, misses and invalidation"""
+
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+from app import pinecone_upsert
+from app.search_cache import SemanticSearchCache, search_cache
+
+KEY = ("meeting:1", 5, True)
+RESULTS = [{"id": "meeting_1_file_0", "score": 0.9}]
+
+
+def vec(*values):
+    return SemanticSearchCache.normalize(list(values))
+
+
+def test_near_duplicate_query_hits():
+    cache = SemanticSearchCache(maxlen=8, threshold=0.97)
+    cache.store(KEY, vec(1.0, 0.0, 0.0), RESULTS)
+
+    assert cache.lookup(KEY, vec(1.0, 0.05, 0.0)) == RESULTS
+    assert cache.lookup(KEY, vec(0.0, 1.0, 0.0)) is None
+
+
+def test_key_must_match():
+    cache = SemanticSearchCache(maxlen=8)
+    cache.store(KEY, vec(1.0, 0.0), RESULTS)
+
+    assert cache.lookup(("meeting:2", 5, True), vec(1.0, 0.0)) is None
+    assert cache.lookup(("meeting:1", 10, True), vec(1.0, 0.0)) is None
+
+
+def test_invalidate_drops_only_that_namespace():
+    cache = SemanticSearchCache(maxlen=8)
+    other_key = ("meeting:2", 5, True)
+    cache.store(KEY, vec(1.0, 0.0), RESULTS)
+    cache.store(other_key, vec(1.0, 0.0), [])
+
+    cache.invalidate("meeting:1")
+
+    assert cache.lookup(KEY, vec(1.0, 0.0)) is None
+    assert cache.lookup(other_key, vec(1.0, 0.0)) == []
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.search_cache.time.monotonic", lambda: clock[0])
+    cache = SemanticSearchCache(maxlen=8, ttl=60)
+    cache.store(KEY, vec(1.0, 0.0), RESULTS)
+
+    clock[0] += 59
+    assert cache.lookup(KEY, vec(1.0, 0.0)) == RESULTS
+    clock[0] += 2
+    assert cache.lookup(KEY, vec(1.0, 0.0)) is None
+
+
+def test_ring_buffer_overwrites_oldest():
+    cache = SemanticSearchCache(maxlen=2)
+    cache.store(KEY, vec(1.0, 0.0, 0.0), ["first"])
+    cache.store(KEY, vec(0.0, 1.0, 0.0), ["second"])
+    cache.store(KEY, vec(0.0, 0.0, 1.0), ["third"])
+
+    assert cache.lookup(KEY, vec(1.0, 0.0, 0.0)) is None
+    assert cache.lookup(KEY, vec(0.0, 0.0, 1.0)) == ["third"]
+
+
+def test_zero_vector_is_not_cacheable():
+    assert SemanticSearchCache.normalize([0.0, 0.0]) is None
+
+
+@pytest.fixture
+def pinecone(monkeypatch):
+    """Route the shared Pinecone client to a handler set by the test"""
+    state = {"handler": None}
+
+    def get_client():
+        return httpx.AsyncClient(
+            base_url="https://index.test",
+            transport=httpx.MockTransport(lambda request: state["handler"](request)),
+        )
+
+    monkeypatch.setattr(pinecone_upsert, "get_pinecone_client", get_client)
+    search_cache.clear()
+    yield state
+    search_cache.clear()
+
+
+def upsert_vectors(count):
+    return [{"id": f"v{i}", "values": [0.1, 0.2], "metadata": {}} for i in range(count)]
+
+
+def test_batch_upsert_invalidates_namespace(pinecone):
+    pinecone["handler"] = lambda request: httpx.Response(
+        200, content=orjson.dumps({"upsertedCount": len(orjson.loads(request.content)["vectors"])})
+    )
+    search_cache.store(KEY, vec(1.0, 0.0), RESULTS)
+
+    assert asyncio.run(pinecone_upsert.batch_upsert(upsert_vectors(3), "meeting:1")) == 3
+    assert search_cache.lookup(KEY, vec(1.0, 0.0)) is None
+
+
+def test_failed_upsert_still_invalidates(pinecone):
+    pinecone["handler"] = lambda request: httpx.Response(400, text="bad request")
+    search_cache.store(KEY, vec(1.0, 0.0), RESULTS)
+
+    with pytest.raises(Exception, match="Pinecone upsert failed"):
+        asyncio.run(pinecone_upsert.batch_upsert(upsert_vectors(1), "meeting:1"))
+    assert search_cache.lookup(KEY, vec(1.0, 0.0)) is None